@@ -16,6 +16,7 @@ from app.core.exceptions import UnauthorizedException, NotFoundException, Forbid
 from app.models import TokenPayload, User
 from app.crud.user import get_user_by_email, get_user_by_id
 from app.services.ai_service import AIService
+from app.services.slack_oauth_service import SlackOAuthService
 from app.services.slack_service import SlackService
 
 reusable_oauth2 = OAuth2PasswordBearer(
@@ -72,3 +73,7 @@ def get_ai_service(session: SessionDep) -> AIService:
 
 def get_slack_service(session: SessionDep) -> SlackService:
     return SlackService(session)
+
+
+def get_slack_oauth_service() -> SlackOAuthService:
+    return SlackOAuthService()
@@ -3,7 +3,7 @@ from sqlmodel import Session
 import hmac
 import hashlib
 import time
-import json
+import orjson
 from typing import Dict, Any
 
 from app.core.config import settings
@@ -62,8 +62,8 @@ async def channel_bot_events(request: Request, session: Session = Depends(get_db
             logger.warning("Invalid Slack signature")
             raise HTTPException(status_code=401, detail="Invalid signature")
         
-        # Parsear el JSON
-        data = json.loads(body_str)
+        # Parsear el JSON directamente desde los bytes
+        data = orjson.loads(body)
         
         # Log del evento recibido
         logger.info("Channel bot event received", 
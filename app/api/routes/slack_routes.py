@@ -4,7 +4,7 @@ from typing import List, Optional
 from datetime import datetime
 
 from app.core.config import settings
-from app.api.deps import get_db, CurrentUser, get_current_active_superuser
+from app.api.deps import get_db, CurrentUser, get_current_active_superuser, get_slack_service, get_slack_oauth_service
 from app.services.slack_service import SlackService
 from app.services.slack_oauth_service import SlackOAuthService
 from app.core.exceptions import SlackException
@@ -58,7 +58,8 @@ async def test_mentions_processing(session: Session = Depends(get_db)):
     # Limpiar cache para probar con nueva configuración
     slack_service.user_service.clear_cache()
     
-    # Obtener información detallada del usuario para debugging
+    # Obtener la entrada del usuario en cache para debugging (ya compactada:
+    # solo los campos de nombre, no el payload completo de users.info)
     user_info = None
     if success and access_token:
         try:
@@ -78,8 +79,7 @@ async def test_mentions_processing(session: Session = Depends(get_db)):
             "real_name": user_info.get("profile", {}).get("real_name") if user_info else None,
             "display_name": user_info.get("profile", {}).get("display_name") if user_info else None,
             "first_name": user_info.get("profile", {}).get("first_name") if user_info else None,
-            "last_name": user_info.get("profile", {}).get("last_name") if user_info else None,
-            "full_user_info": user_info
+            "cached_user_info": user_info
         } if user_info else None
     }
 
@@ -234,7 +234,7 @@ async def get_messages(
 
 
 @router.post("/events")
-async def slack_events(request: Request, session: Session = Depends(get_db)):
+async def slack_events(request: Request, slack_service: SlackService = Depends(get_slack_service)):
     try:
         body = await request.json()
         
@@ -259,9 +259,7 @@ async def slack_events(request: Request, session: Session = Depends(get_db)):
                        team_id=team_id,
                        event_data=event)
 
-            # Usar el servicio para procesar el evento
-            slack_service = SlackService(session=session)
-            
+            # Usar el servicio (inyectado) para procesar el evento
             if slack_service.should_process_event(event):
                 # Obtener access token desde configuración
                 access_token = settings.SLACK_PERSONAL_TOKEN
@@ -313,7 +311,7 @@ async def slack_events(request: Request, session: Session = Depends(get_db)):
 
 
 @router.get("/oauth/callback")
-async def oauth_callback(request: Request):
+async def oauth_callback(request: Request, oauth_service: SlackOAuthService = Depends(get_slack_oauth_service)):
     """
     OAuth callback endpoint for Slack integration.
     """
@@ -321,7 +319,6 @@ async def oauth_callback(request: Request):
     
     try:
         code = request.query_params.get("code")
-        oauth_service = SlackOAuthService()
         
         # Intercambiar código por token
         oauth_data = await oauth_service.exchange_code_for_token(code)
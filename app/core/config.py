@@ -168,6 +168,14 @@ class Settings(BaseSettings):
     RESPONSE_DELAY_LOW: int = 300      # 5 minutos para baja urgencia
     RESPONSE_DELAY_LOCO: int = 5       # 5 segundos para palabra "loco"
     RESPONSE_DELAY_TEST: int = 30      # 30 segundos para pruebas
+    RESPONSE_COALESCE_WINDOW: float = 0.2  # Ventana para agrupar respuestas al mismo canal/hilo (0 = desactivado)
+
+    # Channel Bot Configuration
+    USE_LLM_ROUTER: bool = True  # Consultar al LLM para elegir especialista cuando el scoring por keywords no decide
+    CHANNEL_BOT_SPECULATIVE_RESPONSES: bool = False  # Generar en paralelo la respuesta de todos los especialistas (más tokens, menos latencia)
+
+    # Slack Messages Storage
+    STORE_RAW_EVENT: bool = False  # Guardar en raw_event los campos del evento que no tienen columna propia
 
     def _check_default_secret(self, var_name: str, value: str | None) -> None:
         if value == "changethis":
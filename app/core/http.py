@@ -0,0 +1,33 @@
+import httpx
+
+SLACK_API_URL = "https://slack.com/api"
+
+# Cliente HTTP compartido (keep-alive) para la API de Slack.
+# Se crea al primer uso y se cierra en el lifespan de la aplicación.
+_slack_client: httpx.AsyncClient | None = None
+
+
+def get_slack_client() -> httpx.AsyncClient:
+    """
+    Devuelve el cliente HTTP compartido para la API de Slack, creándolo si no existe.
+    Reutiliza las conexiones TCP/TLS entre requests en lugar de abrir una por llamada.
+    Los paths son relativos a SLACK_API_URL (p. ej. "/chat.postMessage").
+    """
+    global _slack_client
+    if _slack_client is None or _slack_client.is_closed:
+        _slack_client = httpx.AsyncClient(
+            base_url=SLACK_API_URL,
+            timeout=10.0,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+        )
+    return _slack_client
+
+
+async def close_slack_client() -> None:
+    """
+    Cierra el cliente HTTP compartido (se llama al apagar la aplicación).
+    """
+    global _slack_client
+    if _slack_client is not None:
+        await _slack_client.aclose()
+        _slack_client = None
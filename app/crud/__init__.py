@@ -21,12 +21,26 @@ from .item import (
 )
 from .slack_message import (
     create_slack_message,
+    create_slack_message_if_new,
+    create_slack_messages,
     get_slack_message_by_id,
     get_slack_messages,
     update_slack_message,
     delete_slack_message,
     count_slack_messages
 )
+from .channel_specialist import (
+    get_active_channel_specialists
+)
+from .slack_user import (
+    get_fresh_slack_users,
+    upsert_slack_users
+)
+from .slack_message_claim import (
+    claim_slack_message,
+    is_slack_message_claimed,
+    release_slack_message
+)
 
 __all__ = [
     # User operations
@@ -51,9 +65,23 @@ __all__ = [
     
     # Slack message operations
     "create_slack_message",
+    "create_slack_message_if_new",
+    "create_slack_messages",
     "get_slack_message_by_id",
     "get_slack_messages",
     "update_slack_message",
     "delete_slack_message",
     "count_slack_messages",
+    
+    # Channel specialist operations
+    "get_active_channel_specialists",
+    
+    # Slack user operations
+    "get_fresh_slack_users",
+    "upsert_slack_users",
+    
+    # Slack message claim operations
+    "claim_slack_message",
+    "is_slack_message_claimed",
+    "release_slack_message",
 ] 
\ No newline at end of file
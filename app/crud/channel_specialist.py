@@ -0,0 +1,25 @@
+from sqlmodel import Session, select
+
+from app.core.logging import get_logger
+from app.models import ChannelSpecialist
+
+# Inicializar logger
+logger = get_logger(__name__)
+
+
+def get_active_channel_specialists(*, session: Session, channel_id: str) -> list[ChannelSpecialist]:
+    """
+    Obtener los especialistas activos de un canal en una sola consulta.
+    Keywords y prompt viven en la misma fila (columna JSON), así que no hay
+    relaciones que cargar; si pasan a ser tablas aparte, cargarlas acá con
+    selectinload y marcar la relación con lazy="raise" para evitar N+1.
+    """
+    logger.debug("Getting active channel specialists", channel_id=channel_id)
+    statement = (
+        select(ChannelSpecialist)
+        .where(ChannelSpecialist.channel_id == channel_id, ChannelSpecialist.is_active == True)  # noqa: E712
+        .order_by(ChannelSpecialist.id)
+    )
+    specialists = list(session.exec(statement).all())
+    logger.debug("Channel specialists found", channel_id=channel_id, count=len(specialists))
+    return specialists
@@ -1,4 +1,7 @@
+import uuid
 from typing import Any
+from sqlalchemy import insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlmodel import Session, select
 
 from app.core.exceptions import DatabaseException, ValidationException
@@ -24,6 +27,57 @@ def create_slack_message(*, session: Session, slack_message_in: SlackMessageCrea
         raise DatabaseException(f"Failed to create Slack message: {str(e)}")
 
 
+def create_slack_message_if_new(*, session: Session, slack_message_in: SlackMessageCreate) -> uuid.UUID | None:
+    """
+    Inserta el mensaje salvo que ya exista uno con el mismo slack_message_id,
+    en un único INSERT ... ON CONFLICT DO NOTHING RETURNING id.
+    Retorna el id del mensaje creado, o None si era un duplicado.
+    """
+    try:
+        logger.debug("Creating Slack message if new", slack_message_id=slack_message_in.slack_message_id)
+        row = SlackMessage.model_validate(slack_message_in).model_dump()
+        statement = (
+            pg_insert(SlackMessage)
+            .values(**row)
+            .on_conflict_do_nothing(index_elements=["slack_message_id"])
+            .returning(SlackMessage.id)
+        )
+        message_id = session.execute(statement).scalar_one_or_none()
+        session.commit()
+        if message_id is None:
+            logger.debug("Slack message already exists", slack_message_id=slack_message_in.slack_message_id)
+        else:
+            logger.info("Slack message created successfully", slack_message_id=slack_message_in.slack_message_id)
+        return message_id
+    except Exception as e:
+        session.rollback()
+        logger.error("Failed to create Slack message", error=str(e), slack_message_id=slack_message_in.slack_message_id)
+        raise DatabaseException(f"Failed to create Slack message: {str(e)}")
+
+
+def create_slack_messages(*, session: Session, slack_messages_in: list[SlackMessageCreate]) -> int:
+    """
+    Inserta un lote de mensajes de Slack con un único INSERT multi-fila y un único commit.
+    Usa un insert de Core sobre la tabla: sin unit-of-work ni objetos ORM por fila.
+    Retorna la cantidad de mensajes insertados.
+    """
+    if not slack_messages_in:
+        return 0
+    try:
+        logger.debug("Creating Slack messages in bulk", count=len(slack_messages_in))
+        session.execute(
+            insert(SlackMessage.__table__),
+            [SlackMessage.model_validate(message).model_dump() for message in slack_messages_in]
+        )
+        session.commit()
+        logger.info("Slack messages created successfully", count=len(slack_messages_in))
+        return len(slack_messages_in)
+    except Exception as e:
+        session.rollback()
+        logger.error("Failed to create Slack messages in bulk", error=str(e), count=len(slack_messages_in))
+        raise DatabaseException(f"Failed to create Slack messages: {str(e)}")
+
+
 def get_slack_message_by_id(*, session: Session, slack_message_id: str) -> SlackMessage | None:
     logger.debug("Getting Slack message by ID", slack_message_id=slack_message_id)
     statement = select(SlackMessage).where(SlackMessage.slack_message_id == slack_message_id)
@@ -42,7 +96,8 @@ def get_slack_messages(
     limit: int = 100,
     team_id: str | None = None,
     channel_id: str | None = None,
-    user_id: str | None = None
+    user_id: str | None = None,
+    exclude_slack_message_id: str | None = None
 ) -> list[SlackMessage]:
     # Validaciones de entrada
     if skip < 0:
@@ -63,6 +118,9 @@ def get_slack_messages(
     if user_id:
         statement = statement.where(SlackMessage.user_id == user_id)
     
+    if exclude_slack_message_id:
+        statement = statement.where(SlackMessage.slack_message_id != exclude_slack_message_id)
+    
     statement = statement.offset(skip).limit(limit).order_by(SlackMessage.timestamp.desc())
     messages = session.exec(statement).all()
     logger.info("Retrieved Slack messages", count=len(messages))
@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import Session, delete, select
+
+from app.core.exceptions import DatabaseException
+from app.core.logging import get_logger
+from app.models import SlackMessageClaim
+
+# Inicializar logger
+logger = get_logger(__name__)
+
+
+def claim_slack_message(
+    *, session: Session, channel_id: str, message_id: str, ttl_seconds: float
+) -> bool:
+    """
+    Reservar un mensaje con un único INSERT ... ON CONFLICT ... RETURNING (atómico
+    entre workers). Si ya hay una reserva vigente (más nueva que ttl_seconds) no se
+    toca y retorna False; una reserva vencida se renueva.
+    """
+    try:
+        claimed_at = datetime.now(timezone.utc)
+        statement = pg_insert(SlackMessageClaim).values(
+            channel_id=channel_id, message_id=message_id, claimed_at=claimed_at
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=["channel_id", "message_id"],
+            set_={"claimed_at": statement.excluded.claimed_at},
+            where=SlackMessageClaim.claimed_at < claimed_at - timedelta(seconds=ttl_seconds)
+        ).returning(SlackMessageClaim.message_id)
+        claimed = session.execute(statement).first() is not None
+        session.commit()
+        return claimed
+    except Exception as e:
+        session.rollback()
+        logger.error("Failed to claim Slack message", error=str(e), channel_id=channel_id, message_id=message_id)
+        raise DatabaseException(f"Failed to claim Slack message: {str(e)}")
+
+
+def is_slack_message_claimed(
+    *, session: Session, channel_id: str, message_id: str, ttl_seconds: float
+) -> bool:
+    """
+    Verificar si el mensaje tiene una reserva vigente.
+    """
+    try:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=ttl_seconds)
+        statement = select(SlackMessageClaim.message_id).where(
+            SlackMessageClaim.channel_id == channel_id,
+            SlackMessageClaim.message_id == message_id,
+            SlackMessageClaim.claimed_at > cutoff
+        )
+        return session.exec(statement).first() is not None
+    except Exception as e:
+        session.rollback()
+        logger.error("Failed to check Slack message claim", error=str(e), channel_id=channel_id, message_id=message_id)
+        raise DatabaseException(f"Failed to check Slack message claim: {str(e)}")
+
+
+def release_slack_message(*, session: Session, channel_id: str, message_id: str) -> None:
+    """
+    Liberar la reserva de un mensaje (borrar la fila) para que pueda volver a reservarse.
+    """
+    try:
+        session.exec(delete(SlackMessageClaim).where(
+            SlackMessageClaim.channel_id == channel_id,
+            SlackMessageClaim.message_id == message_id
+        ))
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.error("Failed to release Slack message claim", error=str(e), channel_id=channel_id, message_id=message_id)
+        raise DatabaseException(f"Failed to release Slack message claim: {str(e)}")
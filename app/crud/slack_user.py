@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlmodel import Session, select
+
+from app.core.exceptions import DatabaseException
+from app.core.logging import get_logger
+from app.models import SlackUser
+
+# Inicializar logger
+logger = get_logger(__name__)
+
+
+def get_fresh_slack_users(
+    *, session: Session, user_ids: list[str], max_age_seconds: float
+) -> dict[str, tuple[dict[str, Any], datetime]]:
+    """
+    Obtener en una sola consulta los usuarios guardados hace menos de max_age_seconds.
+    Retorna user_id -> (user_info, fetched_at).
+    """
+    if not user_ids:
+        return {}
+    try:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=max_age_seconds)
+        statement = select(SlackUser).where(
+            SlackUser.user_id.in_(user_ids), SlackUser.fetched_at > cutoff
+        )
+        users = {user.user_id: (user.user_info, user.fetched_at) for user in session.exec(statement)}
+        logger.debug("Shared Slack users found", requested=len(user_ids), found=len(users))
+        return users
+    except Exception as e:
+        session.rollback()
+        logger.error("Failed to get Slack users", error=str(e), count=len(user_ids))
+        raise DatabaseException(f"Failed to get Slack users: {str(e)}")
+
+
+def upsert_slack_users(*, session: Session, users: dict[str, dict[str, Any]]) -> None:
+    """
+    Guarda (o actualiza) la información de varios usuarios con un único
+    INSERT ... ON CONFLICT DO UPDATE y un único commit.
+    """
+    if not users:
+        return
+    try:
+        fetched_at = datetime.now(timezone.utc)
+        statement = pg_insert(SlackUser).values([
+            {"user_id": user_id, "user_info": user_info, "fetched_at": fetched_at}
+            for user_id, user_info in users.items()
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=["user_id"],
+            set_={"user_info": statement.excluded.user_info, "fetched_at": statement.excluded.fetched_at}
+        )
+        session.execute(statement)
+        session.commit()
+        logger.debug("Slack users saved", count=len(users))
+    except Exception as e:
+        session.rollback()
+        logger.error("Failed to save Slack users", error=str(e), count=len(users))
+        raise DatabaseException(f"Failed to save Slack users: {str(e)}")
@@ -1,4 +1,7 @@
 import os
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 import sentry_sdk
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
@@ -6,7 +9,10 @@ from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
 from app.core.config import settings
+from app.core.http import close_slack_client
 from app.core.logging import get_logger
+from app.services.channel_bot_service import ChannelBotService
+from app.services.slack_response_scheduler import SlackResponseScheduler
 
 # Debug: Imprimir variables de entorno
 print("=== ENVIRONMENT VARIABLES ===")
@@ -27,10 +33,23 @@ if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
     logger.info("Sentry initialized", environment=settings.ENVIRONMENT)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # Escritor por lotes de los mensajes del canal
+    ChannelBotService.start_message_writer()
+    yield
+    # Vaciar la cola de escritura, detener el scheduler y cerrar el cliente HTTP compartido de Slack
+    await ChannelBotService.aclose()
+    await SlackResponseScheduler.aclose()
+    await close_slack_client()
+    logger.info("Shared resources closed")
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
+    lifespan=lifespan,
 )
 
 logger.info("FastAPI application created", title=settings.PROJECT_NAME)
@@ -28,7 +28,10 @@ from .slack import (
     SlackMessageCreate,
     SlackMessageUpdate,
     SlackMessagePublic,
-    SlackMessagesPublic
+    SlackMessagesPublic,
+    SlackUser,
+    SlackMessageClaim,
+    compact_raw_event
 )
 
 from .channel_specialist import (
@@ -73,6 +76,9 @@ __all__ = [
     "SlackMessageUpdate", 
     "SlackMessagePublic",
     "SlackMessagesPublic",
+    "SlackUser",
+    "SlackMessageClaim",
+    "compact_raw_event",
     
     # Channel Specialist models
     "ChannelSpecialist",
@@ -11,7 +11,7 @@ class ChannelSpecialistBase(SQLModel):
     expertise_keywords: Any = Field(default_factory=list, sa_column=Column(JSON), description="Palabras clave de expertise")
     system_prompt: str = Field(description="Prompt del sistema para el especialista")
     is_active: bool = Field(default=True, description="Si el especialista está activo")
-    channel_id: str = Field(description="ID del canal donde está configurado")
+    channel_id: str = Field(index=True, description="ID del canal donde está configurado")
 
 
 class ChannelSpecialistCreate(ChannelSpecialistBase):
@@ -2,7 +2,20 @@ import uuid
 from datetime import datetime, timezone
 from typing import Any
 from sqlmodel import Field, SQLModel
-from sqlalchemy import JSON, Column
+from sqlalchemy import JSON, Column, DateTime
+
+
+# Campos del evento de Slack que ya se guardan en columnas propias
+SLACK_EVENT_EXTRACTED_KEYS = frozenset({
+    "type", "subtype", "client_msg_id", "team", "channel", "user", "text", "ts",
+    "thread_ts", "parent_user_id", "files", "blocks", "reactions", "edited",
+    "reply_count", "reply_users_count", "latest_reply", "subscribed",
+})
+
+
+def compact_raw_event(event: dict[str, Any]) -> dict[str, Any]:
+    """Copia del evento sin los campos que ya se persisten en columnas propias."""
+    return {k: v for k, v in event.items() if k not in SLACK_EVENT_EXTRACTED_KEYS}
 
 
 class SlackMessageBase(SQLModel):
@@ -55,4 +68,34 @@ class SlackMessagePublic(SlackMessageBase):
 
 class SlackMessagesPublic(SQLModel):
     data: list[SlackMessagePublic]
-    count: int 
\ No newline at end of file
+    count: int
+
+
+class SlackUser(SQLModel, table=True):
+    """
+    Información de usuarios de Slack (respuesta de users.info), compartida entre
+    workers como cache de segundo nivel de SlackUserService.
+    """
+    __tablename__ = "slack_users"
+    
+    user_id: str = Field(primary_key=True, max_length=255)
+    user_info: Any = Field(default_factory=dict, sa_column=Column(JSON))
+    fetched_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_column=Column(DateTime(timezone=True), nullable=False)
+    )
+
+
+class SlackMessageClaim(SQLModel, table=True):
+    """
+    Reserva de un mensaje para que el bot del canal lo responda una sola vez,
+    compartida entre workers y reinicios: responde quien inserta la fila.
+    """
+    __tablename__ = "slack_message_claims"
+    
+    channel_id: str = Field(primary_key=True, max_length=255)
+    message_id: str = Field(primary_key=True, max_length=255)
+    claimed_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_column=Column(DateTime(timezone=True), nullable=False)
+    )
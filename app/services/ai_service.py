@@ -1,11 +1,14 @@
 from typing import Dict, Any, Optional, List, TypedDict
+from collections import OrderedDict
 from sqlmodel import Session
-import json
+import orjson
 import random
+import re
 from datetime import datetime
 
+from langchain_core.language_models import BaseChatModel
 from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage, SystemMessage
+from langchain.schema import BaseMessage, HumanMessage, SystemMessage
 from langgraph.graph import StateGraph, END
 
 from app.core.config import settings
@@ -13,10 +16,18 @@ from app.models import SlackMessage
 from app.crud.slack_message import get_slack_messages
 from app.core.logging import LoggerMixin
 
+# Mensajes que son solo un saludo/acuse y no aportan contexto al LLM
+_GREETING_RE = re.compile(
+    r"^\W*(hola|buenas|buen[oa]s\s+(d[ií]as|tardes|noches)|hey|hi|hello|gracias|ok|dale|saludos|jaja+)"
+    r"(\s+(a\s+todos|equipo|gente|chicos))?\W*$",
+    re.IGNORECASE,
+)
+
 
 class ConversationState(TypedDict):
     """Estado del flujo de conversación con LangGraph"""
     message: Dict[str, Any]
+    text: str
     channel_context: List[SlackMessage]
     user_responses: List[SlackMessage]
     urgency_analysis: Optional[Dict[str, Any]]
@@ -31,7 +42,7 @@ class PromptBuilder:
     """Clase responsable de construir prompts para diferentes tareas de IA"""
     
     @staticmethod
-    def build_urgency_evaluation_prompt(message: Dict[str, Any], context_text: str) -> tuple[str, str]:
+    def build_urgency_evaluation_prompt(message: Dict[str, Any], text: str, context_text: str) -> tuple[str, str]:
         """Construye el prompt para evaluación de urgencia"""
         system_prompt = """
         Eres un experto en evaluación de urgencia de mensajes de Slack. Tu tarea es analizar la urgencia de un mensaje basándote en múltiples factores, NO solo en palabras clave como "urgente" o "importante".
@@ -63,7 +74,7 @@ class PromptBuilder:
         
         Canal: {message.get('channel', 'unknown')}
         Usuario: {message.get('user', 'unknown')}
-        Mensaje: {message.get('text', '')}
+        Mensaje: {text}
         
         Contexto del canal:
         {context_text}
@@ -74,7 +85,7 @@ class PromptBuilder:
         return system_prompt, human_prompt
     
     @staticmethod
-    def build_message_analysis_prompt(message: Dict[str, Any], context_text: str, urgency_info: str) -> tuple[str, str]:
+    def build_message_analysis_prompt(message: Dict[str, Any], text: str, context_text: str, urgency_info: str) -> tuple[str, str]:
         """Construye el prompt para análisis de mensajes"""
         system_prompt = f"""
         Eres un asistente que analiza mensajes de Slack para determinar si {settings.AI_PRINCIPAL_USER_NAME} ({settings.AI_PRINCIPAL_ROLE} de {settings.AI_COMPANY_NAME}) debe responder.
@@ -104,7 +115,7 @@ class PromptBuilder:
         
         Canal: {message.get('channel', 'unknown')}
         Usuario: {message.get('user', 'unknown')}
-        Mensaje: {message.get('text', '')}
+        Mensaje: {text}
         
         Contexto del canal:
         {context_text}
@@ -122,7 +133,7 @@ class PromptBuilder:
         return system_prompt, human_prompt
     
     @staticmethod
-    def build_sensitivity_check_prompt(message: Dict[str, Any], context_text: str) -> tuple[str, str]:
+    def build_sensitivity_check_prompt(message: Dict[str, Any], text: str, context_text: str) -> tuple[str, str]:
         """Construye el prompt para verificación de sensibilidad"""
         system_prompt = f"""
         Eres un experto en análisis de sensibilidad de conversaciones. Tu tarea es detectar situaciones donde {settings.AI_PRINCIPAL_USER_NAME} debería EVITAR responder para no meterse en conflictos o situaciones delicadas.
@@ -156,7 +167,7 @@ class PromptBuilder:
         
         Canal: {message.get('channel', 'unknown')}
         Usuario: {message.get('user', 'unknown')}
-        Mensaje actual: {message.get('text', '')}
+        Mensaje actual: {text}
         
         Contexto del canal:
         {context_text}
@@ -167,7 +178,7 @@ class PromptBuilder:
         return system_prompt, human_prompt
     
     @staticmethod
-    def build_response_generation_prompt(message: Dict[str, Any], context_text: str, 
+    def build_response_generation_prompt(message: Dict[str, Any], text: str, context_text: str, 
                                        responses_text: str, urgency_info: str) -> tuple[str, str]:
         """Construye el prompt para generación de respuestas"""
         system_prompt = f"""
@@ -201,7 +212,7 @@ class PromptBuilder:
         
         human_prompt = f"""
         **MENSAJE ACTUAL A RESPONDER:**
-        {message.get('text', '')}
+        {text}
         
         **CONTEXTO DE LA CONVERSACIÓN ACTUAL (últimos mensajes del canal):**
         {context_text}
@@ -323,14 +334,21 @@ class ResponseGenerator:
 class AIService(LoggerMixin):
     """Servicio principal de IA con flujo de LangGraph refactorizado"""
     
-    def __init__(self, session: Session):
+    # Memorias de LangChain por canal, compartidas por todo el proceso (LRU)
+    CHANNEL_MEMORY_CACHE_SIZE = 256
+    CHANNEL_MEMORY_TTL_SECONDS = 300
+    _channel_memories: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+    
+    def __init__(self, session: Session, llm: Optional[BaseChatModel] = None):
         self.session = session
         self.context_manager = ContextManager(session)
         self.prompt_builder = PromptBuilder()
         self.response_generator = ResponseGenerator()
         
-        # Inicializar LLM
-        if not settings.OPENAI_API_KEY:
+        # Inicializar LLM (se puede inyectar uno ya construido, p. ej. en tests)
+        if llm is not None:
+            self.llm = llm
+        elif not settings.OPENAI_API_KEY:
             self.logger.warning("OPENAI_API_KEY not configured, AI features will be disabled")
             self.llm = None
         else:
@@ -390,7 +408,9 @@ class AIService(LoggerMixin):
             channel_id = message.get("channel", "unknown")
             current_msg_id = message.get("client_msg_id") or message.get("ts")
             
-            context_messages = self.context_manager.get_channel_context(channel_id, current_msg_id)
+            context_messages = self._compact_context(
+                self.context_manager.get_channel_context(channel_id, current_msg_id)
+            )
             
             self.logger.info("Channel context retrieved", 
                            channel_id=channel_id,
@@ -430,7 +450,7 @@ class AIService(LoggerMixin):
             channel_context = state["channel_context"]
             
             context_text = self.context_manager.format_messages_for_prompt(channel_context, is_user_responses=False)
-            system_prompt, human_prompt = self.prompt_builder.build_urgency_evaluation_prompt(message, context_text)
+            system_prompt, human_prompt = self.prompt_builder.build_urgency_evaluation_prompt(message, state["text"], context_text)
             
             urgency_analysis = self._call_llm_with_json_parsing(system_prompt, human_prompt, "urgency analysis")
             return {**state, "urgency_analysis": urgency_analysis}
@@ -444,8 +464,7 @@ class AIService(LoggerMixin):
         self.logger.info("🔍 Starting message analysis")
         
         # Detectar palabra "loco" para prueba - DEBE RESPONDER SIEMPRE
-        message = state["message"]
-        message_text = message.get('text', '').lower()
+        message_text = state["text"].lower()
         if "loco" in message_text:
             self.logger.info("🎯 Detected 'loco' keyword - bypassing all analysis")
             return {
@@ -464,13 +483,14 @@ class AIService(LoggerMixin):
             return self._get_default_message_analysis(state)
         
         try:
+            message = state["message"]
             channel_context = state["channel_context"]
             urgency_analysis = state.get("urgency_analysis", {})
             
             context_text = self.context_manager.format_messages_for_prompt(channel_context, is_user_responses=False)
             urgency_info = self._format_urgency_info(urgency_analysis)
             
-            system_prompt, human_prompt = self.prompt_builder.build_message_analysis_prompt(message, context_text, urgency_info)
+            system_prompt, human_prompt = self.prompt_builder.build_message_analysis_prompt(message, state["text"], context_text, urgency_info)
             
             analysis = self._call_llm_with_json_parsing(system_prompt, human_prompt, "message analysis")
             return {**state, "analysis": analysis}
@@ -491,7 +511,7 @@ class AIService(LoggerMixin):
             channel_context = state["channel_context"]
             
             context_text = self.context_manager.format_messages_for_prompt(channel_context, is_user_responses=False)
-            system_prompt, human_prompt = self.prompt_builder.build_sensitivity_check_prompt(message, context_text)
+            system_prompt, human_prompt = self.prompt_builder.build_sensitivity_check_prompt(message, state["text"], context_text)
             
             sensitivity_check = self._call_llm_with_json_parsing(system_prompt, human_prompt, "sensitivity check")
             return {**state, "sensitivity_check": sensitivity_check}
@@ -509,7 +529,7 @@ class AIService(LoggerMixin):
         sensitivity_check = state.get("sensitivity_check", {})
         
         # Respuesta específica para palabra "loco"
-        message_text = message.get('text', '').lower()
+        message_text = state["text"].lower()
         if "loco" in message_text:
             return self._handle_loco_response(state)
         
@@ -531,7 +551,7 @@ class AIService(LoggerMixin):
             urgency_info = self._format_urgency_info(urgency_analysis)
             
             system_prompt, human_prompt = self.prompt_builder.build_response_generation_prompt(
-                message, context_text, responses_text, urgency_info
+                message, state["text"], context_text, responses_text, urgency_info
             )
             
             response = self.llm.invoke([SystemMessage(content=system_prompt), HumanMessage(content=human_prompt)])
@@ -550,8 +570,7 @@ class AIService(LoggerMixin):
     def _should_respond_condition(self, state: ConversationState) -> str:
         """Determina si debe generar respuesta"""
         analysis = state.get("analysis", {})
-        message = state.get("message", {})
-        message_text = message.get('text', '').lower()
+        message_text = state.get("text", "").lower()
         
         # Si contiene "loco", ir directamente a generar respuesta (saltar sensibilidad)
         if "loco" in message_text:
@@ -607,12 +626,12 @@ class AIService(LoggerMixin):
             
             if start != -1 and end != 0:
                 json_str = content[start:end]
-                result = json.loads(json_str)
+                result = orjson.loads(json_str)
                 return result
             else:
                 raise ValueError("No JSON found")
                 
-        except (json.JSONDecodeError, ValueError) as e:
+        except (orjson.JSONDecodeError, ValueError) as e:
             self.logger.warning(f"Failed to parse {task_name}", error=str(e))
             return self._get_default_json_response(task_name)
     
@@ -708,12 +727,16 @@ class AIService(LoggerMixin):
         return defaults.get(task_name, {"error": "Unknown task"})
     
     # Métodos públicos
-    def analyze_message(self, message: Dict[str, Any], conversation_context: list[SlackMessage] = None) -> Dict[str, Any]:
-        """Analiza un mensaje usando el flujo de LangGraph"""
+    def analyze_message(self, message: Dict[str, Any], conversation_context: list[SlackMessage] = None,
+                        text: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Analiza un mensaje usando el flujo de LangGraph.
+        Si se pasa text (p. ej. con las menciones ya resueltas), se usa en lugar de message["text"].
+        """
         self.logger.info("🚀 Starting AI workflow analysis")
         
         try:
-            initial_state = self._create_initial_state(message, conversation_context)
+            initial_state = self._create_initial_state(message, conversation_context, text)
             config = self._create_workflow_config(message)
             
             self.logger.info("🔄 Invoking LangGraph workflow")
@@ -744,10 +767,11 @@ class AIService(LoggerMixin):
             analysis.get("requires_response", False)
         )
     
-    def get_response(self, message: Dict[str, Any], conversation_context: list[SlackMessage] = None) -> Optional[str]:
-        """Obtiene una respuesta generada para un mensaje"""
+    def get_response(self, message: Dict[str, Any], conversation_context: list[SlackMessage] = None,
+                     text: Optional[str] = None) -> Optional[str]:
+        """Obtiene una respuesta generada para un mensaje (text como en analyze_message)"""
         try:
-            initial_state = self._create_initial_state(message, conversation_context)
+            initial_state = self._create_initial_state(message, conversation_context, text)
             config = self._create_workflow_config(message)
             
             result = self.workflow.invoke(initial_state, config=config)
@@ -757,26 +781,92 @@ class AIService(LoggerMixin):
             self.logger.error("Error getting response", error=str(e))
             return None
     
-    def generate_response(self, prompt: str) -> str:
+    def generate_response(self, prompt: str, history: Optional[List[BaseMessage]] = None) -> str:
         """
         Genera una respuesta simple para un prompt dado.
         Método simplificado para uso directo sin el workflow completo.
+        Si se pasa history (p. ej. la memoria del canal), se envía como turnos previos.
         """
         try:
             if not self.llm:
                 return "Lo siento, el servicio de IA no está configurado."
             
-            response = self.llm.invoke([HumanMessage(content=prompt)])
+            response = self.llm.invoke([*(history or []), HumanMessage(content=prompt)])
             return response.content
             
         except Exception as e:
             self.logger.error("Error generating simple response", error=str(e))
             return f"Error generando respuesta: {str(e)}"
 
-    def _create_initial_state(self, message: Dict[str, Any], conversation_context: list[SlackMessage] = None) -> ConversationState:
+    def _compact_context(self, messages: List[SlackMessage], budget_tokens: int = 1500) -> List[SlackMessage]:
+        """
+        Compacta el contexto del canal antes de armar los prompts.
+        Descarta mensajes triviales (menos de 3 palabras o saludos), puntúa el resto
+        por recencia × longitud y los empaqueta dentro del presupuesto de tokens
+        (estimado como len(text) // 4). Conserva el orden original.
+        """
+        if not messages:
+            return []
+        
+        candidates = []
+        for msg in messages:
+            text = (msg.text or "").strip()
+            if len(text.split()) < 3 or _GREETING_RE.match(text):
+                continue
+            candidates.append(msg)
+        candidates = self._dedupe_context(candidates)
+        
+        # Recencia: el mensaje más nuevo tiene rank 0
+        by_recency = sorted(candidates, key=lambda m: m.timestamp or "", reverse=True)
+        scored = []
+        for rank, msg in enumerate(by_recency):
+            length = len(msg.text)
+            score = (1.0 / (1 + rank)) * min(length, 500)
+            scored.append((score, max(length // 4, 1), msg))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        
+        kept_ids = set()
+        used_tokens = 0
+        for _, tokens, msg in scored:
+            if used_tokens + tokens > budget_tokens:
+                continue
+            used_tokens += tokens
+            kept_ids.add(id(msg))
+        
+        compacted = [msg for msg in candidates if id(msg) in kept_ids]
+        self.logger.debug("Conversation context compacted", 
+                        original_count=len(messages),
+                        compacted_count=len(compacted),
+                        estimated_tokens=used_tokens)
+        return compacted
+
+    def _dedupe_context(self, messages: List[SlackMessage], threshold: float = 0.85) -> List[SlackMessage]:
+        """
+        Elimina mensajes casi duplicados (reintentos, citas en threads).
+        Compara shingles de 3 caracteres con similitud de Jaccard y, ante un
+        duplicado, conserva el mensaje más reciente. Conserva el orden original.
+        """
+        kept: List[tuple[set, SlackMessage]] = []
+        for msg in sorted(messages, key=lambda m: m.timestamp or "", reverse=True):
+            text = " ".join((msg.text or "").lower().split())
+            shingles = {text[i:i + 3] for i in range(max(len(text) - 2, 1))}
+            is_duplicate = any(
+                len(shingles & other) / len(shingles | other) >= threshold
+                for other, _ in kept
+            )
+            if not is_duplicate:
+                kept.append((shingles, msg))
+        
+        kept_ids = {id(msg) for _, msg in kept}
+        return [msg for msg in messages if id(msg) in kept_ids]
+
+    def _create_initial_state(self, message: Dict[str, Any], conversation_context: list[SlackMessage] = None,
+                              text: Optional[str] = None) -> ConversationState:
         """Crea el estado inicial para el workflow"""
         return {
             "message": message,
+            "text": message.get("text", "") if text is None else text,
+            # Sin compactar: el nodo get_channel_context arma y compacta el contexto
             "channel_context": conversation_context or [],
             "user_responses": [],
             "urgency_analysis": None,
@@ -788,13 +878,25 @@ class AIService(LoggerMixin):
         }
     
     def _create_workflow_config(self, message: Dict[str, Any]) -> Dict[str, Any]:
-        """Crea la configuración para el workflow"""
-        return {
+        """
+        Crea la configuración para el workflow.
+        Se guarda en el mensaje para que analyze_message y get_response la reutilicen.
+        """
+        config = message.get("_wf_config")
+        if config is not None:
+            return config
+        
+        channel = message.get("channel", "unknown")
+        ts = message.get("ts", "unknown")
+        msg_id = message.get("client_msg_id", ts)
+        config = {
             "configurable": {
-                "thread_id": f"slack_{message.get('channel', 'unknown')}_{message.get('ts', 'unknown')}",
-                "checkpoint_id": f"msg_{message.get('client_msg_id', message.get('ts', 'unknown'))}"
+                "thread_id": f"slack_{channel}_{ts}",
+                "checkpoint_id": f"msg_{msg_id}"
             }
         }
+        message["_wf_config"] = config
+        return config
     
     def get_channel_memory_context(self, channel_id: str, limit: int = 10) -> List[SlackMessage]:
         """
@@ -832,9 +934,7 @@ class AIService(LoggerMixin):
             recent_messages = self.get_channel_memory_context(channel_id, limit)
             
             # Crear memoria de LangChain (nueva sintaxis)
-            from langchain_core.memory import BaseMemory
-            from langchain_community.memory import ConversationBufferWindowMemory
-            from langchain_core.messages import HumanMessage, AIMessage
+            from langchain.memory import ConversationBufferWindowMemory
             
             # Crear memoria con ventana deslizante
             memory = ConversationBufferWindowMemory(
@@ -880,38 +980,31 @@ class AIService(LoggerMixin):
     def get_or_create_channel_memory(self, channel_id: str, limit: int = 10) -> Dict[str, Any]:
         """
         Obtiene o crea memoria para un canal específico.
-        Implementa cache para evitar recrear memoria constantemente.
+        La memoria se comparte entre requests en un LRU de proceso y se
+        reconstruye desde la base de datos cada CHANNEL_MEMORY_TTL_SECONDS.
         """
         try:
-            # Cache key para este canal
-            cache_key = f"memory_{channel_id}"
-            
-            # Verificar si ya tenemos memoria en cache
-            if hasattr(self, '_channel_memories'):
-                if cache_key in self._channel_memories:
-                    cached_memory = self._channel_memories[cache_key]
-                    
-                    # Verificar si la memoria es reciente (menos de 5 minutos)
-                    last_updated = datetime.fromisoformat(cached_memory.get("last_updated", "1970-01-01"))
-                    if (datetime.now() - last_updated).seconds < 300:  # 5 minutos
-                        self.logger.info("Using cached memory for channel", 
-                                       channel_id=channel_id)
-                        return cached_memory
+            memories = AIService._channel_memories
+            
+            # Verificar si ya tenemos memoria reciente en cache
+            cached_memory = memories.get(channel_id)
+            if cached_memory is not None:
+                last_updated = datetime.fromisoformat(cached_memory["last_updated"])
+                if (datetime.now() - last_updated).total_seconds() < self.CHANNEL_MEMORY_TTL_SECONDS:
+                    memories.move_to_end(channel_id)
+                    self.logger.debug("Using cached memory for channel", 
+                                    channel_id=channel_id)
+                    return cached_memory
             
             # Crear nueva memoria
             memory_context = self.create_langchain_memory_for_channel(channel_id, limit)
             
-            # Guardar en cache
-            if not hasattr(self, '_channel_memories'):
-                self._channel_memories = {}
-            
-            self._channel_memories[cache_key] = memory_context
-            
-            # Limpiar cache antiguo (mantener solo últimos 50 canales)
-            if len(self._channel_memories) > 50:
-                # Convertir a lista y tomar los últimos 50
-                memories_list = list(self._channel_memories.items())
-                self._channel_memories = dict(memories_list[-50:])
+            # Guardar en cache solo si se pudo crear, descartando el canal menos usado
+            if memory_context.get("memory") is not None:
+                memories[channel_id] = memory_context
+                memories.move_to_end(channel_id)
+                if len(memories) > self.CHANNEL_MEMORY_CACHE_SIZE:
+                    memories.popitem(last=False)
             
             return memory_context
             
@@ -1,7 +1,12 @@
 from sqlmodel import Session
-import httpx
-import json
-from typing import Dict, Any, List, Optional
+import asyncio
+import hashlib
+import logging
+import math
+import orjson
+import re
+import time
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 
 from app.core.config import settings
@@ -9,21 +14,231 @@ from app.core.logging import get_logger
 from app.services.ai_service import AIService
 from app.models.channel_specialist import ChannelSpecialist, ChannelSpecialistCreate
 # Guardar el mensaje en la base de datos
-from app.crud.slack_message import create_slack_message
-from app.models.slack import SlackMessageCreate
+from app.core.db import engine
+from app.core.exceptions import DatabaseException
+from app.core.http import get_slack_client
+from app.crud.channel_specialist import get_active_channel_specialists
+from app.crud.slack_message_claim import (
+    claim_slack_message,
+    is_slack_message_claimed,
+    release_slack_message,
+)
+from app.crud.slack_message import create_slack_message, create_slack_messages
+from app.models.slack import SlackMessageCreate, compact_raw_event
 
 logger = get_logger(__name__)
 
+# Especialistas de prueba para canales sin especialistas configurados.
+# Se construyen una sola vez y son comunes a todos los canales: no modificarlos.
+_STUB_CREATED_AT = datetime.now()
+_STUB_SPECIALIST_FIELDS = (
+    {
+        "id": 1,
+        "name": "Arquitecto de Software",
+        "description": "Especialista en arquitectura y diseño de software",
+        "expertise_keywords": ["arquitectura", "diseño", "patrones", "microservicios", "escalabilidad"],
+        "system_prompt": "Eres un arquitecto de software experimentado. Proporciona consejos sobre diseño, patrones arquitectónicos, y mejores prácticas.",
+    },
+    {
+        "id": 2,
+        "name": "Desarrollador Node.js",
+        "description": "Especialista en desarrollo con Node.js y JavaScript",
+        "expertise_keywords": ["nodejs", "javascript", "npm", "express", "async", "promises"],
+        "system_prompt": "Eres un desarrollador experto en Node.js. Ayuda con problemas de JavaScript, npm, y desarrollo backend.",
+    },
+)
+_STATIC_SPECIALISTS = tuple(
+    ChannelSpecialist(
+        **fields,
+        is_active=True,
+        channel_id="*",
+        created_at=_STUB_CREATED_AT,
+        updated_at=_STUB_CREATED_AT
+    )
+    for fields in _STUB_SPECIALIST_FIELDS
+)
+
+# Plantillas de prompts: solo se sustituyen las partes variables con format_map
+_SELECT_PROMPT_TMPL = (
+    "Analiza el siguiente mensaje y determina qué especialista es más relevante.\n\n"
+    "Mensaje: \"{text}\"\n\n"
+    "Especialistas disponibles:\n"
+    "{specialists_text}\n\n"
+    "Responde solo con el nombre del especialista más relevante, o \"ninguno\" si no hay ninguno relevante."
+)
+
+_SPECIALIST_PROMPT_TMPL = (
+    "{system_prompt}\n\n"
+    "Contexto: Eres {name} en un canal de Slack. Responde de manera natural y directa, "
+    "como lo haría un humano en una conversación casual.\n\n"
+    "Reglas importantes:\n"
+    "- NO uses saludos como \"¡Hola!\" o \"Hola\"\n"
+    "- Responde directamente a la pregunta o comentario\n"
+    "- Sé natural y conversacional\n"
+    "- No parezcas un bot o asistente\n"
+    "- Considera el contexto de la conversación reciente\n"
+    "- NO repitas información que ya se mencionó en el contexto\n\n"
+    "Mensaje del usuario: \"{text}\"\n\n"
+    "Responde como {name}:"
+)
+
+# Menciones de usuario/bot en el texto del mensaje (<@U123ABC>)
+_BOT_MENTION_RE = re.compile(r'<@[A-Z0-9]+>')
+
+# Tokenización para el scoring local de especialistas
+_WORD_RE = re.compile(r"\w+")
+_STOP_WORDS = frozenset({
+    "con", "para", "por", "que", "una", "uno", "los", "las", "del", "como",
+    "sobre", "este", "esta", "eso", "esto", "hay", "tengo", "the", "and", "for",
+})
+
 class ChannelBotService:
     """
     Servicio para manejar el bot público del canal con especialistas.
     """
     
+    # Score mínimo (similitud coseno) para elegir especialista sin consultar al LLM
+    KEYWORD_MATCH_THRESHOLD = 0.15
+    # Vectores de términos por especialista: (id, updated_at) -> {término: peso}
+    _specialist_vectors: Dict[tuple, Dict[str, float]] = {}
+    
+    # Cache compartido de selección de especialista: clave -> (expira_en, specialist_id)
+    SELECT_CACHE_TTL_SECONDS = 600
+    SELECT_CACHE_MAX_SIZE = 4096
+    _select_cache: Dict[tuple, tuple] = {}
+    _select_cache_hits = 0
+    _select_cache_misses = 0
+    
+    # Cache de especialistas por canal: channel_id -> (expira_en, especialistas)
+    SPECIALIST_CACHE_TTL_SECONDS = 600
+    SPECIALIST_CACHE_MAX_SIZE = 512
+    _specialist_cache: Dict[str, tuple] = {}
+    
+    # Mensajes reservados para responder: tabla slack_message_claims, compartida entre
+    # workers y reinicios. Una reserva vence a la hora y el mensaje puede volver a responderse
+    CLAIM_TTL_SECONDS = 3600
+    
+    # Cola de escritura de mensajes del canal, persistidos por lotes en segundo plano
+    WRITE_BATCH_MAX_SIZE = 64
+    WRITE_BATCH_MAX_WAIT_SECONDS = 0.05
+    WRITE_QUEUE_MAX_SIZE = 10000
+    _write_queue: Optional[asyncio.Queue] = None
+    _writer_task: Optional[asyncio.Task] = None
+    
     def __init__(self, session: Session):
         self.session = session
         self.ai_service = AIService(session=session)
         self.slack_api_url = "https://slack.com/api"
         self.bot_token = settings.SLACK_BOT_TOKEN
+        self._auth_headers = {
+            "Authorization": f"Bearer {self.bot_token}",
+            "Content-Type": "application/json"
+        }
+    
+    @classmethod
+    async def aclose(cls) -> None:
+        """
+        Detiene el escritor en segundo plano (se llama al apagar la aplicación)
+        y persiste los mensajes que quedaron en la cola.
+        """
+        if cls._writer_task is not None:
+            cls._writer_task.cancel()
+            try:
+                await cls._writer_task
+            except asyncio.CancelledError:
+                pass
+            
+            # Persistir lo que quedó en la cola
+            pending = []
+            while not cls._write_queue.empty():
+                pending.append(cls._write_queue.get_nowait())
+            if pending:
+                cls._write_batch(pending)
+            cls._writer_task = None
+            cls._write_queue = None
+    
+    @classmethod
+    def start_message_writer(cls) -> None:
+        """
+        Inicia la tarea que persiste por lotes los mensajes encolados
+        (se llama al iniciar la aplicación).
+        """
+        if cls._writer_task is None or cls._writer_task.done():
+            cls._write_queue = asyncio.Queue(maxsize=cls.WRITE_QUEUE_MAX_SIZE)
+            cls._writer_task = asyncio.create_task(cls._run_message_writer())
+    
+    @classmethod
+    async def _run_message_writer(cls) -> None:
+        """
+        Junta hasta WRITE_BATCH_MAX_SIZE mensajes o los que lleguen en
+        WRITE_BATCH_MAX_WAIT_SECONDS y los inserta con un único commit.
+        """
+        queue = cls._write_queue
+        loop = asyncio.get_running_loop()
+        batch: List[SlackMessageCreate] = []
+        try:
+            while True:
+                batch.append(await queue.get())
+                deadline = loop.time() + cls.WRITE_BATCH_MAX_WAIT_SECONDS
+                while len(batch) < cls.WRITE_BATCH_MAX_SIZE:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    # asyncio.wait y no wait_for: antes de Python 3.12, wait_for descarta la
+                    # cancelación si el get ya terminó y aclose se quedaría esperando
+                    getter = asyncio.ensure_future(queue.get())
+                    try:
+                        await asyncio.wait((getter,), timeout=timeout)
+                    finally:
+                        # Con timeout o cancelación no se pierde un mensaje ya tomado de la cola
+                        if getter.done():
+                            batch.append(getter.result())
+                        else:
+                            getter.cancel()
+                    if not getter.done():
+                        break
+                
+                pending, batch = batch, []
+                await asyncio.to_thread(cls._write_batch, pending)
+        except asyncio.CancelledError:
+            # Persistir el lote que se estaba juntando antes de terminar
+            if batch:
+                cls._write_batch(batch)
+            raise
+    
+    @staticmethod
+    def _write_batch(batch: List[SlackMessageCreate]) -> None:
+        """
+        Inserta un lote de mensajes con su propia sesión. Si el lote falla
+        (p. ej. por un mensaje duplicado) se reintenta mensaje por mensaje.
+        """
+        with Session(engine) as session:
+            try:
+                create_slack_messages(session=session, slack_messages_in=batch)
+            except DatabaseException:
+                for message in batch:
+                    try:
+                        create_slack_message(session=session, slack_message_in=message)
+                    except DatabaseException as e:
+                        logger.warning("Dropping channel message that could not be persisted",
+                                      slack_message_id=message.slack_message_id,
+                                      error=str(e))
+    
+    def _enqueue_message(self, slack_message: SlackMessageCreate) -> bool:
+        """
+        Encola el mensaje para el escritor en segundo plano.
+        Retorna False si no hay escritor activo en este loop o la cola está llena.
+        """
+        writer = self._writer_task
+        if writer is None or writer.done() or writer.get_loop() is not asyncio.get_running_loop():
+            return False
+        try:
+            self._write_queue.put_nowait(slack_message)
+            return True
+        except asyncio.QueueFull:
+            logger.warning("Write queue full, persisting message directly",
+                          slack_message_id=slack_message.slack_message_id)
+            return False
     
     async def handle_channel_message(self, event: Dict[str, Any]) -> None:
         """
@@ -31,19 +246,17 @@ class ChannelBotService:
         Analiza el contexto y decide si algún especialista debe responder.
         """
         try:
+            # Ignorar mensajes de bots y de subclases (ediciones, eliminaciones, etc.)
+            # antes de leer el resto del evento
+            if event.get("bot_id") or event.get("subtype"):
+                return
+            
             channel_id = event.get("channel")
             user_id = event.get("user")
             text = event.get("text", "")
             timestamp = event.get("ts")
-            message_id = event.get("client_msg_id") or timestamp
-            
-            # Ignorar mensajes del propio bot
-            if event.get("bot_id"):
-                return
-            
-            # Ignorar mensajes de subclases (ediciones, eliminaciones, etc.)
-            if event.get("subtype"):
-                return
+            client_msg_id = event.get("client_msg_id")
+            message_id = client_msg_id or timestamp
             
             # Verificar si ya respondimos a este mensaje
             if await self._has_already_responded(channel_id, message_id):
@@ -57,21 +270,22 @@ class ChannelBotService:
                        user_id=user_id,
                        text_length=len(text))
 
-            slack_message = SlackMessageCreate(
-                slack_message_id=event.get("client_msg_id") or event.get("ts"),
+            # Sin validación acá: el modelo de tabla se valida al persistir
+            slack_message = SlackMessageCreate.model_construct(
+                slack_message_id=message_id,
                 team_id=event.get("team") or "unknown",
-                channel_id=event.get("channel"),
+                channel_id=channel_id,
                 channel_name=None,
-                user_id=event.get("user"),
+                user_id=user_id,
                 user_name=None,
-                text=event.get("text", ""),
+                text=text,
                 message_type=event.get("type", "message"),
-                subtype=event.get("subtype"),
-                timestamp=event.get("ts"),
+                subtype=None,
+                timestamp=timestamp,
                 thread_ts=event.get("thread_ts"),
                 parent_user_id=event.get("parent_user_id"),
-                client_msg_id=event.get("client_msg_id"),
-                is_bot=bool(event.get("bot_id")),
+                client_msg_id=client_msg_id,
+                is_bot=False,
                 files=event.get("files", []),
                 blocks=event.get("blocks", []),
                 reactions=event.get("reactions", []),
@@ -80,17 +294,22 @@ class ChannelBotService:
                 reply_users_count=event.get("reply_users_count"),
                 latest_reply=event.get("latest_reply"),
                 subscribed=event.get("subscribed"),
-                raw_event=event
+                raw_event=compact_raw_event(event) if settings.STORE_RAW_EVENT else None
             )
-            create_slack_message(session=self.session, slack_message_in=slack_message)
+            if not self._enqueue_message(slack_message):
+                # Sin escritor en segundo plano: escritura directa fuera del event loop
+                await asyncio.to_thread(
+                    create_slack_message, session=self.session, slack_message_in=slack_message
+                )
                     
         except Exception as e:
-            logger.error(f"Error handling channel message: {e}")
+            logger.error("Error handling channel message", error=str(e))
     
     async def handle_app_mention(self, event: Dict[str, Any]) -> None:
         """
         Maneja cuando alguien menciona al bot directamente.
         """
+        claimed = False
         try:
             channel_id = event.get("channel")
             user_id = event.get("user")
@@ -102,12 +321,13 @@ class ChannelBotService:
                        user_id=user_id,
                        text=text)
             
-            # Verificar si ya respondimos a este mensaje
-            if await self._has_already_responded(channel_id, message_id):
+            # Reservar el mensaje de forma atómica para no responderlo dos veces
+            if not await self._claim(channel_id, message_id):
                 logger.info("Already responded to this mention", 
                            channel_id=channel_id,
                            message_id=message_id)
                 return
+            claimed = True
             
             # Remover la mención del bot del texto
             cleaned_text = self._remove_bot_mention(text)
@@ -122,158 +342,187 @@ class ChannelBotService:
                 )
                 return
             
-            # Seleccionar el especialista más relevante automáticamente
-            relevant_specialist = await self.select_relevant_specialist(cleaned_text, specialists)
-            if not relevant_specialist:
-                # Si no encuentra especialista relevante, usar el primero
-                relevant_specialist = specialists[0]
-            
-            # Generar respuesta del especialista seleccionado
-            response = await self.generate_specialist_response(
-                cleaned_text, relevant_specialist, channel_id, user_id
-            )
+            if settings.CHANNEL_BOT_SPECULATIVE_RESPONSES and len(specialists) > 1:
+                # Generar todas las respuestas en paralelo con la selección y quedarse con la elegida
+                relevant_specialist, *responses = await asyncio.gather(
+                    self.select_relevant_specialist(cleaned_text, specialists),
+                    *(
+                        self.generate_specialist_response(
+                            cleaned_text, specialist, channel_id, user_id, update_memory=False
+                        )
+                        for specialist in specialists
+                    )
+                )
+                if not relevant_specialist:
+                    relevant_specialist = specialists[0]
+                response = responses[specialists.index(relevant_specialist)]
+                if response:
+                    self._update_channel_memory(channel_id, cleaned_text, response)
+            else:
+                # Seleccionar el especialista más relevante automáticamente
+                relevant_specialist = await self.select_relevant_specialist(cleaned_text, specialists)
+                if not relevant_specialist:
+                    # Si no encuentra especialista relevante, usar el primero
+                    relevant_specialist = specialists[0]
+                
+                # Generar respuesta del especialista seleccionado
+                response = await self.generate_specialist_response(
+                    cleaned_text, relevant_specialist, channel_id, user_id
+                )
             
             if response:
                 await self.send_channel_message(channel_id, response, relevant_specialist.name)
-                # Marcar que ya respondimos a este mensaje
-                await self._mark_as_responded(channel_id, message_id)
+            else:
+                # Liberar la reserva para que un nuevo intento pueda responder
+                await self._release(channel_id, message_id)
             
         except Exception as e:
-            logger.error(f"Error handling app mention: {e}")
+            logger.error("Error handling app mention", error=str(e))
+            if claimed:
+                await self._release(channel_id, message_id)
     
     async def get_channel_specialists(self, channel_id: str) -> List[ChannelSpecialist]:
         """
         Obtiene los especialistas configurados para un canal específico.
+        Los resultados se cachean por canal durante SPECIALIST_CACHE_TTL_SECONDS.
         """
-        # TODO: Implementar consulta a la base de datos
-        # Por ahora, retornar especialistas de prueba
-        return [
-            ChannelSpecialist(
-                id=1,
-                name="Arquitecto de Software",
-                description="Especialista en arquitectura y diseño de software",
-                expertise_keywords=["arquitectura", "diseño", "patrones", "microservicios", "escalabilidad"],
-                system_prompt="Eres un arquitecto de software experimentado. Proporciona consejos sobre diseño, patrones arquitectónicos, y mejores prácticas.",
-                is_active=True,
-                channel_id=channel_id,
-                created_at=datetime.now(),
-                updated_at=datetime.now()
-            ),
-            ChannelSpecialist(
-                id=2,
-                name="Desarrollador Node.js",
-                description="Especialista en desarrollo con Node.js y JavaScript",
-                expertise_keywords=["nodejs", "javascript", "npm", "express", "async", "promises"],
-                system_prompt="Eres un desarrollador experto en Node.js. Ayuda con problemas de JavaScript, npm, y desarrollo backend.",
-                is_active=True,
-                channel_id=channel_id,
-                created_at=datetime.now(),
-                updated_at=datetime.now()
-            )
-        ]
+        cached = self._specialist_cache.get(channel_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        
+        specialists = await asyncio.to_thread(self._load_channel_specialists, channel_id)
+        
+        cache = ChannelBotService._specialist_cache
+        if len(cache) >= self.SPECIALIST_CACHE_MAX_SIZE and channel_id not in cache:
+            del cache[next(iter(cache))]
+        cache[channel_id] = (time.monotonic() + self.SPECIALIST_CACHE_TTL_SECONDS, specialists)
+        return specialists
+    
+    def _load_channel_specialists(self, channel_id: str) -> List[ChannelSpecialist]:
+        """
+        Carga los especialistas de un canal (sin cache).
+        Si el canal no tiene especialistas configurados, usa los de prueba.
+        """
+        specialists = get_active_channel_specialists(session=self.session, channel_id=channel_id)
+        return specialists or list(_STATIC_SPECIALISTS)
+    
+    @classmethod
+    def invalidate_channel(cls, channel_id: str) -> None:
+        """
+        Descarta los especialistas cacheados de un canal (p. ej. tras reconfigurarlo).
+        """
+        cls._specialist_cache.pop(channel_id, None)
     
     async def select_relevant_specialist(self, text: str, specialists: List[ChannelSpecialist]) -> Optional[ChannelSpecialist]:
         """
         Selecciona el especialista más relevante basado en el contenido del mensaje.
+        Con un único especialista, o si el mensaje nombra a uno solo, lo elige
+        directamente. Si no, puntúa localmente contra las keywords de cada
+        especialista y solo consulta al LLM ante empate o sin coincidencias,
+        si USE_LLM_ROUTER está activo.
         """
         try:
-            # Crear prompt para analizar el texto
-            analysis_prompt = f"""
-            Analiza el siguiente mensaje y determina qué especialista es más relevante.
+            if len(specialists) <= 1:
+                return specialists[0] if specialists else None
+            
+            text_lower = text.lower()
+            named = [s for s in specialists if s.name.lower() in text_lower]
+            if len(named) == 1:
+                logger.info("Selected specialist", specialist=named[0].name, method="name")
+                return named[0]
+            
+            scores = self._score_specialists(text, specialists)
+            best_score = max(scores, default=0.0)
+            if best_score > self.KEYWORD_MATCH_THRESHOLD and scores.count(best_score) == 1:
+                specialist = specialists[scores.index(best_score)]
+                logger.info("Selected specialist", 
+                           specialist=specialist.name,
+                           method="keywords",
+                           score=round(best_score, 3))
+                return specialist
+            
+            if not settings.USE_LLM_ROUTER:
+                return None
+            
+            cache_key = self._select_cache_key(text, specialists)
+            cached = self._select_cache.get(cache_key)
+            if cached and cached[0] > time.monotonic():
+                ChannelBotService._select_cache_hits += 1
+                logger.debug("Specialist selection cache hit", 
+                            hits=self._select_cache_hits,
+                            misses=self._select_cache_misses)
+                return next((s for s in specialists if s.id == cached[1]), None)
+            ChannelBotService._select_cache_misses += 1
             
-            Mensaje: "{text}"
-            
-            Especialistas disponibles:
-            {self._format_specialists_for_analysis(specialists)}
-            
-            Responde solo con el nombre del especialista más relevante, o "ninguno" si no hay ninguno relevante.
-            """
+            # Crear prompt para analizar el texto
+            analysis_prompt = _SELECT_PROMPT_TMPL.format_map({
+                "text": text,
+                "specialists_text": self._format_specialists_for_analysis(specialists)
+            })
             
-            # Usar AI para analizar
-            response = self.ai_service.generate_response(analysis_prompt)
+            # Usar AI para analizar (bloqueante: se ejecuta en un thread)
+            response = await asyncio.to_thread(self.ai_service.generate_response, analysis_prompt)
             selected_name = response.strip().lower()
             
             # Encontrar el especialista seleccionado
             for specialist in specialists:
                 if specialist.name.lower() in selected_name:
-                    logger.info(f"Selected specialist: {specialist.name}")
+                    logger.info("Selected specialist", specialist=specialist.name, method="llm")
+                    self._store_selection(cache_key, specialist.id)
                     return specialist
             
+            if "ninguno" in selected_name:
+                self._store_selection(cache_key, None)
             return None
             
         except Exception as e:
-            logger.error(f"Error selecting specialist: {e}")
+            logger.error("Error selecting specialist", error=str(e))
             return None
     
-    async def generate_specialist_response(self, text: str, specialist: ChannelSpecialist, channel_id: str, user_id: str) -> Optional[str]:
+    async def generate_specialist_response(self, text: str, specialist: ChannelSpecialist, channel_id: str, user_id: str,
+                                           update_memory: bool = True) -> Optional[str]:
         """
         Genera una respuesta usando el especialista seleccionado con memoria del canal.
+        Con update_memory=False no registra el intercambio (respuestas especulativas).
         """
         try:
-            logger.info("Starting specialist response generation", 
-                       channel_id=channel_id,
-                       specialist=specialist.name,
-                       text_length=len(text))
-            
             # Obtener memoria del canal
             memory_context = self.ai_service.get_or_create_channel_memory(channel_id, limit=5)
             memory = memory_context.get("memory")
             
-            logger.info("Retrieved memory context", 
-                       channel_id=channel_id,
-                       has_memory=bool(memory),
-                       memory_size=len(memory.chat_memory.messages) if memory else 0)
-            
-            # Crear prompt contextual con memoria
-            memory_text = ""
-            if memory and memory.chat_memory.messages:
-                memory_text = "\n\nContexto de la conversación reciente:\n"
-                for msg in memory.chat_memory.messages[-3:]:  # Últimos 3 mensajes
-                    if hasattr(msg, 'content'):
-                        memory_text += f"- {msg.content}\n"
+            # La memoria del canal va al LLM como turnos previos (últimos 3 mensajes)
+            history = memory.chat_memory.messages[-3:] if memory else []
             
             # Crear prompt contextual
-            prompt = f"""
-            {specialist.system_prompt}
+            prompt = _SPECIALIST_PROMPT_TMPL.format_map({
+                "system_prompt": specialist.system_prompt,
+                "name": specialist.name,
+                "text": text
+            })
             
-            Contexto: Eres {specialist.name} en un canal de Slack. Responde de manera natural y directa, como lo haría un humano en una conversación casual.
-            
-            Reglas importantes:
-            - NO uses saludos como "¡Hola!" o "Hola"
-            - Responde directamente a la pregunta o comentario
-            - Sé natural y conversacional
-            - No parezcas un bot o asistente
-            - Considera el contexto de la conversación reciente
-            - NO repitas información que ya se mencionó en el contexto
-            {memory_text}
-            
-            Mensaje del usuario: "{text}"
-            
-            Responde como {specialist.name}:
-            """
-            
-            logger.info("Generated prompt", 
-                       channel_id=channel_id,
-                       prompt_length=len(prompt))
-            
-            response = self.ai_service.generate_response(prompt)
-            
-            logger.info("Generated response", 
-                       channel_id=channel_id,
-                       response_length=len(response) if response else 0)
+            # El LLM es bloqueante: ejecutarlo en un thread para permitir respuestas en paralelo
+            response = await asyncio.to_thread(self.ai_service.generate_response, prompt, history)
             
             # Actualizar memoria con el nuevo mensaje y respuesta
-            if memory and response:
+            if update_memory and memory and response:
                 memory.chat_memory.add_user_message(text)
                 memory.chat_memory.add_ai_message(response)
-                logger.info("Updated memory", 
+            
+            # Un único log con todo el contexto, solo si el nivel está habilitado
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Specialist response generated", 
                            channel_id=channel_id,
-                           new_memory_size=len(memory.chat_memory.messages))
+                           specialist=specialist.name,
+                           text_length=len(text),
+                           has_memory=bool(memory),
+                           memory_size=len(memory.chat_memory.messages) if memory else 0,
+                           prompt_length=len(prompt),
+                           response_length=len(response) if response else 0)
             
             return response
             
         except Exception as e:
-            logger.error(f"Error generating specialist response: {e}", 
+            logger.error("Error generating specialist response", 
                         channel_id=channel_id,
                         specialist=specialist.name,
                         error=str(e))
@@ -284,37 +533,42 @@ class ChannelBotService:
         Envía un mensaje al canal de Slack.
         """
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.slack_api_url}/chat.postMessage",
-                    headers={
-                        "Authorization": f"Bearer {self.bot_token}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "channel": channel_id,
-                        "text": text,
-                        "username": specialist_name,
-                        "icon_emoji": ":robot_face:"
-                    }
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    if result.get("ok"):
-                        logger.info("Message sent successfully", channel_id=channel_id)
-                        return True
-                    else:
-                        logger.error("Slack API error", error=result.get("error"))
-                        return False
+            response = await get_slack_client().post(
+                "/chat.postMessage",
+                content=orjson.dumps({
+                    "channel": channel_id,
+                    "text": text,
+                    "username": specialist_name,
+                    "icon_emoji": ":robot_face:"
+                }),
+                headers=self._auth_headers
+            )
+            
+            if response.status_code == 200:
+                result = orjson.loads(response.content)
+                if result.get("ok"):
+                    logger.info("Message sent successfully", channel_id=channel_id)
+                    return True
                 else:
-                    logger.error("HTTP error sending message", status_code=response.status_code)
+                    logger.error("Slack API error", error=result.get("error"))
                     return False
-                    
+            else:
+                logger.error("HTTP error sending message", status_code=response.status_code)
+                return False
+            
         except Exception as e:
-            logger.error(f"Error sending channel message: {e}")
+            logger.error("Error sending channel message", error=str(e))
             return False
     
+    async def send_channel_messages(self, messages: List[Tuple[str, str, str]]) -> List[bool]:
+        """
+        Envía varios mensajes en paralelo sobre el cliente compartido.
+        Cada mensaje es una tupla (channel_id, text, specialist_name).
+        """
+        return list(await asyncio.gather(
+            *(self.send_channel_message(*message) for message in messages)
+        ))
+    
     async def configure_channel(self, channel_id: str, specialists_config: Dict[str, Any]) -> Dict[str, Any]:
         """
         Configura especialistas para un canal específico.
@@ -325,6 +579,9 @@ class ChannelBotService:
                        channel_id=channel_id,
                        config=specialists_config)
             
+            # Que el próximo evento vea la nueva configuración
+            self.invalidate_channel(channel_id)
+            
             return {
                 "channel_id": channel_id,
                 "specialists_count": len(specialists_config),
@@ -332,16 +589,100 @@ class ChannelBotService:
             }
             
         except Exception as e:
-            logger.error(f"Error configuring channel: {e}")
+            logger.error("Error configuring channel", error=str(e))
             raise
     
+    def _update_channel_memory(self, channel_id: str, text: str, response: str) -> None:
+        """
+        Registra en la memoria del canal el mensaje del usuario y la respuesta enviada.
+        """
+        memory = self.ai_service.get_or_create_channel_memory(channel_id, limit=5).get("memory")
+        if memory:
+            memory.chat_memory.add_user_message(text)
+            memory.chat_memory.add_ai_message(response)
+    
     def _remove_bot_mention(self, text: str) -> str:
         """
         Remueve la mención del bot del texto.
         """
-        # Remover patrones como <@BOT_ID> o @bot_name
-        import re
-        return re.sub(r'<@[A-Z0-9]+>', '', text).strip()
+        # Remover patrones como <@BOT_ID>
+        return _BOT_MENTION_RE.sub('', text).strip()
+    
+    def _score_specialists(self, text: str, specialists: List[ChannelSpecialist]) -> List[float]:
+        """
+        Calcula la similitud coseno entre el texto y cada especialista usando
+        unigramas y bigramas ponderados por IDF entre los especialistas del canal.
+        """
+        message_terms = self._extract_terms(text)
+        if not message_terms or not specialists:
+            return [0.0] * len(specialists)
+        
+        vectors = [self._get_specialist_vector(specialist) for specialist in specialists]
+        total = len(vectors)
+        scores = []
+        message_norm = math.sqrt(sum(count * count for count in message_terms.values()))
+        for vector in vectors:
+            dot = 0.0
+            weights = {}
+            for term, weight in vector.items():
+                document_frequency = sum(1 for other in vectors if term in other)
+                weights[term] = weight * (math.log((1 + total) / (1 + document_frequency)) + 1)
+            for term, count in message_terms.items():
+                if term in weights:
+                    dot += count * weights[term]
+            vector_norm = math.sqrt(sum(w * w for w in weights.values()))
+            scores.append(dot / (message_norm * vector_norm) if dot else 0.0)
+        return scores
+    
+    def _get_specialist_vector(self, specialist: ChannelSpecialist) -> Dict[str, float]:
+        """
+        Obtiene (y cachea) los términos de nombre, descripción y keywords de un especialista.
+        """
+        key = (specialist.id, specialist.updated_at)
+        vector = self._specialist_vectors.get(key)
+        if vector is None:
+            document = " ".join([
+                specialist.name,
+                specialist.description or "",
+                " ".join(specialist.expertise_keywords or []),
+            ])
+            vector = {term: float(count) for term, count in self._extract_terms(document).items()}
+            self._specialist_vectors[key] = vector
+        return vector
+    
+    @staticmethod
+    def _extract_terms(text: str) -> Dict[str, int]:
+        """
+        Extrae unigramas y bigramas normalizados (sin stop words ni palabras cortas).
+        """
+        words = [
+            word for word in _WORD_RE.findall(text.lower())
+            if len(word) > 2 and word not in _STOP_WORDS
+        ]
+        terms: Dict[str, int] = {}
+        for term in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+            terms[term] = terms.get(term, 0) + 1
+        return terms
+    
+    def _select_cache_key(self, text: str, specialists: List[ChannelSpecialist]) -> tuple:
+        """
+        Genera la clave de cache a partir del texto normalizado y los especialistas disponibles.
+        """
+        text_hash = hashlib.blake2b(text.lower().strip().encode(), digest_size=16).digest()
+        return text_hash, frozenset(s.id for s in specialists)
+    
+    def _store_selection(self, cache_key: tuple, specialist_id: Optional[int]) -> None:
+        """
+        Guarda una decisión de selección en el cache, descartando entradas viejas si está lleno.
+        """
+        cache = ChannelBotService._select_cache
+        now = time.monotonic()
+        if len(cache) >= self.SELECT_CACHE_MAX_SIZE:
+            for key in [k for k, (expires_at, _) in cache.items() if expires_at <= now]:
+                del cache[key]
+            if len(cache) >= self.SELECT_CACHE_MAX_SIZE:
+                del cache[next(iter(cache))]
+        cache[cache_key] = (now + self.SELECT_CACHE_TTL_SECONDS, specialist_id)
     
     def _format_specialists_for_analysis(self, specialists: List[ChannelSpecialist]) -> str:
         """
@@ -355,50 +696,64 @@ class ChannelBotService:
     
     async def _has_already_responded(self, channel_id: str, message_id: str) -> bool:
         """
-        Verifica si ya respondimos a este mensaje específico.
+        Verifica si ya respondimos (o estamos respondiendo) a este mensaje específico.
         """
         try:
-            # TODO: Implementar verificación en base de datos
-            # Por ahora, usar un cache simple en memoria
-            cache_key = f"{channel_id}:{message_id}"
-            
-            # Verificar si ya procesamos este mensaje
-            if hasattr(self, '_processed_messages'):
-                if cache_key in self._processed_messages:
-                    return True
-            else:
-                self._processed_messages = set()
-            
-            return False
-            
-        except Exception as e:
-            logger.error(f"Error checking if already responded: {e}")
+            return await asyncio.to_thread(
+                self._run_claim_query, is_slack_message_claimed,
+                channel_id=channel_id, message_id=message_id, ttl_seconds=self.CLAIM_TTL_SECONDS
+            )
+        except DatabaseException as e:
+            logger.error("Error checking if already responded", error=str(e))
             return False
     
-    async def _mark_as_responded(self, channel_id: str, message_id: str) -> None:
+    async def _claim(self, channel_id: str, message_id: str) -> bool:
         """
-        Marca que ya respondimos a este mensaje.
+        Reserva un mensaje para responderlo. Devuelve False si ya estaba reservado,
+        por este u otro worker: la reserva es un INSERT ... ON CONFLICT atómico en la base.
+        Si la base falla no se responde, para no pagar dos veces LLM y Slack.
         """
         try:
-            cache_key = f"{channel_id}:{message_id}"
-            
-            if not hasattr(self, '_processed_messages'):
-                self._processed_messages = set()
-            
-            self._processed_messages.add(cache_key)
-            
-            # Limpiar cache antiguo (mantener solo últimos 100 mensajes)
-            if len(self._processed_messages) > 100:
-                # Convertir a lista y tomar los últimos 100
-                messages_list = list(self._processed_messages)
-                self._processed_messages = set(messages_list[-100:])
-            
-            logger.info("Marked message as responded", 
+            claimed = await asyncio.to_thread(
+                self._run_claim_query, claim_slack_message,
+                channel_id=channel_id, message_id=message_id, ttl_seconds=self.CLAIM_TTL_SECONDS
+            )
+        except DatabaseException as e:
+            logger.error("Error claiming message", 
+                        error=str(e),
+                        channel_id=channel_id,
+                        message_id=message_id)
+            return False
+        
+        if claimed:
+            logger.info("Claimed message for response", 
                        channel_id=channel_id,
                        message_id=message_id)
-            
-        except Exception as e:
-            logger.error(f"Error marking message as responded: {e}")
+        return claimed
+    
+    async def _release(self, channel_id: str, message_id: str) -> None:
+        """
+        Libera la reserva de un mensaje que finalmente no se respondió.
+        """
+        try:
+            await asyncio.to_thread(
+                self._run_claim_query, release_slack_message,
+                channel_id=channel_id, message_id=message_id
+            )
+        except DatabaseException as e:
+            logger.error("Error releasing message claim", 
+                        error=str(e),
+                        channel_id=channel_id,
+                        message_id=message_id)
+    
+    @staticmethod
+    def _run_claim_query(crud_fn, **kwargs: Any) -> Any:
+        """
+        Ejecuta una operación sobre slack_message_claims con su propia sesión (corre
+        en un thread): el commit de la reserva no toca la sesión del request.
+        """
+        with Session(engine) as session:
+            return crud_fn(session=session, **kwargs)
     
     async def handle_request(self, request: Dict[str, Any]) -> None:
         """
@@ -408,17 +763,18 @@ class ChannelBotService:
             logger.info("Received request", request=request)
             
             # Verificar tipo de evento
-            event_type = request.get("event", {}).get("type")
+            event = request.get("event") or {}
+            event_type = event.get("type")
             
             if event_type == "message":
-                await self.handle_channel_message(request["event"])
+                await self.handle_channel_message(event)
             elif event_type == "app_mention":
-                await self.handle_app_mention(request["event"])
+                await self.handle_app_mention(event)
             else:
                 logger.info("Unhandled event type", event_type=event_type)
         
         except Exception as e:
-            logger.error(f"Error handling request: {e}")
+            logger.error("Error handling request", error=str(e))
     
     async def retry_handler(self, request: Dict[str, Any]) -> None:
         """
@@ -437,4 +793,4 @@ class ChannelBotService:
             await self.handle_request(request)
         
         except Exception as e:
-            logger.error(f"Error in retry handler: {e}")
\ No newline at end of file
+            logger.error("Error in retry handler", error=str(e))
\ No newline at end of file
@@ -1,6 +1,34 @@
 from typing import Dict, Any, List
 import re
 
+# Preguntas directas, combinadas en una sola alternancia compilada
+QUESTION_PATTERNS = [
+    r"\?$",  # Termina con ?
+    r"¿.*\?",  # Pregunta en español
+    r"puedes",  # "¿puedes hacer...?"
+    r"podrías",  # "¿podrías...?"
+    r"necesito",  # "necesito ayuda"
+    r"ayuda",  # "ayuda con..."
+]
+_QUESTION_RE = re.compile("|".join(QUESTION_PATTERNS))
+
+# Palabras que determinan la urgencia
+HIGH_URGENCY_WORDS = ["urgente", "crítico", "emergencia", "error", "caído", "roto"]
+MEDIUM_URGENCY_WORDS = ["problema", "bug", "ayuda", "necesito"]
+
+
+def _compile_keywords(keywords: List[str]) -> re.Pattern:
+    """Compila una lista de palabras clave en una sola alternancia (búsqueda por substring)."""
+    return re.compile("|".join(map(re.escape, keywords)))
+
+
+# Un único autómata para todas las palabras de urgencia: una pasada sobre el texto
+_URGENCY_LEVELS = {
+    **{word: "medium" for word in MEDIUM_URGENCY_WORDS},
+    **{word: "high" for word in HIGH_URGENCY_WORDS},
+}
+_URGENCY_RE = _compile_keywords(sorted(_URGENCY_LEVELS, key=len, reverse=True))
+
 
 class MessageAnalyzer:
     def __init__(self, user_id: str = "U123456", user_name: str = "madim"):
@@ -27,15 +55,11 @@ class MessageAnalyzer:
             "crítico"
         ]
         
+        # Nombre del usuario + palabras clave en una sola alternancia
+        self._direct_keywords_re = _compile_keywords([self.user_name, *self.direct_keywords])
+        
         # Preguntas directas
-        self.question_patterns = [
-            r"\?$",  # Termina con ?
-            r"¿.*\?",  # Pregunta en español
-            r"puedes",  # "¿puedes hacer...?"
-            r"podrías",  # "¿podrías...?"
-            r"necesito",  # "necesito ayuda"
-            r"ayuda",  # "ayuda con..."
-        ]
+        self.question_patterns = QUESTION_PATTERNS
 
     def is_direct_message(self, message: Dict[str, Any]) -> bool:
         """
@@ -44,15 +68,15 @@ class MessageAnalyzer:
         text = message.get("text", "").lower()
         
         # 1. Menciona directamente al usuario
-        if self.user_name in text or f"<@{self.user_id}>" in text:
+        if f"<@{self.user_id}>" in text:
             return True
             
-        # 2. Contiene palabras clave directas
-        if any(keyword in text for keyword in self.direct_keywords):
+        # 2. Contiene su nombre o palabras clave directas (una sola pasada)
+        if self._direct_keywords_re.search(text):
             return True
             
         # 3. Es una pregunta directa
-        if any(re.search(pattern, text) for pattern in self.question_patterns):
+        if _QUESTION_RE.search(text):
             return True
             
         # 4. Es en un thread donde ya participaste
@@ -67,13 +91,11 @@ class MessageAnalyzer:
         """
         text = message.get("text", "").lower()
         
-        # Urgencia alta
-        if any(word in text for word in ["urgente", "crítico", "emergencia", "error", "caído", "roto"]):
-            return "high"
-            
-        # Urgencia media
-        if any(word in text for word in ["problema", "bug", "ayuda", "necesito"]):
-            return "medium"
-            
-        # Urgencia baja
-        return "low" 
\ No newline at end of file
+        # Recorre el texto una vez y se queda con la urgencia más alta encontrada
+        level = "low"
+        for match in _URGENCY_RE.finditer(text):
+            level = _URGENCY_LEVELS[match.group()]
+            if level == "high":
+                break
+        
+        return level 
\ No newline at end of file
@@ -1,8 +1,10 @@
 import httpx
+import orjson
 from typing import Dict, Any, Optional
 
 from app.core.config import settings
 from app.core.exceptions import SlackException
+from app.core.http import get_slack_client
 from app.core.logging import LoggerMixin
 
 
@@ -40,19 +42,18 @@ class SlackOAuthService(LoggerMixin):
             raise SlackException("Missing authorization code")
             
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://slack.com/api/oauth.v2.access",
-                    data={
-                        "client_id": self.client_id,
-                        "client_secret": self.client_secret,
-                        "code": code,
-                        "redirect_uri": self.redirect_uri,
-                    },
-                    headers={"Content-Type": "application/x-www-form-urlencoded"}
-                )
-                
-            data = response.json()
+            response = await get_slack_client().post(
+                "/oauth.v2.access",
+                data={
+                    "client_id": self.client_id,
+                    "client_secret": self.client_secret,
+                    "code": code,
+                    "redirect_uri": self.redirect_uri,
+                },
+                headers={"Content-Type": "application/x-www-form-urlencoded"}
+            )
+            
+            data = orjson.loads(response.content)
             
             if not data.get("ok"):
                 error = data.get("error", "Unknown error")
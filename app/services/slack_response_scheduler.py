@@ -1,173 +1,199 @@
 import asyncio
+import logging
+import orjson
 import random
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from datetime import datetime, timedelta, timezone
+from types import MappingProxyType
+from typing import Awaitable, Callable, Dict, Any, List, Optional, Set
 from sqlmodel import Session
 
 from app.core.logging import LoggerMixin
 from app.core.config import settings
+from app.core.http import get_slack_client
 from app.services.ai_service import AIService
 
+# Endpoint y headers de chat.postMessage con el token personal, armados una sola vez
+# (el cliente HTTP compartido también se usa con otros tokens)
+_POST_MESSAGE_URL = "/chat.postMessage"
+_POST_MESSAGE_HEADERS = {
+    "Authorization": f"Bearer {settings.SLACK_PERSONAL_TOKEN}",
+    "Content-Type": "application/json"
+}
+
+# Tiempos de respuesta por urgencia (en minutos) y su descripción
+_RESPONSE_TIMES = MappingProxyType({
+    "high": {"min": 1, "max": 5},      # 1-5 minutos
+    "medium": {"min": 5, "max": 10},   # 5-10 minutos  
+    "low": {"min": 10, "max": 15},     # 10-15 minutos
+    "none": {"min": 20, "max": 30}     # 20-30 minutos
+})
+_URGENCY_DESCRIPTIONS = MappingProxyType({
+    "high": "Respuesta inmediata (1-5 minutos)",
+    "medium": "Respuesta rápida (5-10 minutos)", 
+    "low": "Respuesta normal (10-15 minutos)",
+    "none": "Respuesta cuando sea posible (20-30 minutos)"
+})
+
+# Mensajes de log por tipo de respuesta programada: (programando, encolada, error)
+_SCHEDULE_LOGS = {
+    "urgency": ("📅 Scheduling Slack response", "📋 Response queued successfully", "Error scheduling response"),
+    "test": ("🧪 Scheduling test response", "🧪 Test response queued successfully", "Error scheduling test response"),
+    "loco": ("🎯 Scheduling 'loco' response", "🎯 'Loco' response queued successfully", "Error scheduling 'loco' response"),
+}
+
 
 class SlackResponseScheduler(LoggerMixin):
     """
     Servicio para programar respuestas de Slack basadas en la urgencia del mensaje.
     """
     
+    # Respuestas programadas, compartidas entre instancias: timers del loop
+    # pendientes y envíos en curso
+    _pending: Set[asyncio.TimerHandle] = set()
+    _sending: Set[asyncio.Task] = set()
+    # Respuestas vencidas esperando la ventana de agrupación: (canal, thread_ts) -> textos
+    _outbox: Dict[tuple, List[str]] = {}
+    
     def __init__(self, session: Session):
         self.session = session
         self.ai_service = AIService(session)
         
-        # Configuración de tiempos de respuesta por urgencia (en minutos)
-        self.response_times = {
-            "high": {"min": 1, "max": 5},      # 1-5 minutos
-            "medium": {"min": 5, "max": 10},   # 5-10 minutos  
-            "low": {"min": 10, "max": 15},     # 10-15 minutos
-            "none": {"min": 20, "max": 30}     # 20-30 minutos
+        # Delays configurados en el .env (en segundos), leídos una sola vez
+        self._delay_by_urgency = {
+            "high": settings.RESPONSE_DELAY_HIGH,
+            "medium": settings.RESPONSE_DELAY_MEDIUM,
+            "low": settings.RESPONSE_DELAY_LOW
         }
+        self._delay_loco = settings.RESPONSE_DELAY_LOCO
+        self._delay_test = settings.RESPONSE_DELAY_TEST
+        self._coalesce_window = settings.RESPONSE_COALESCE_WINDOW
     
     def schedule_response(self, message: Dict[str, Any], urgency_level: str, 
                          response: str, team_id: str) -> None:
         """
         Programa una respuesta para ser enviada según el nivel de urgencia.
         """
-        try:
-            # Determinar delay según urgencia usando configuración del .env
-            if urgency_level == "high":
-                delay_seconds = settings.RESPONSE_DELAY_HIGH
-            elif urgency_level == "medium":
-                delay_seconds = settings.RESPONSE_DELAY_MEDIUM
-            else:  # low
-                delay_seconds = settings.RESPONSE_DELAY_LOW
-            
-            # Calcular tiempo de envío
-            send_time = datetime.now(timezone.utc) + timedelta(seconds=delay_seconds)
-            
-            self.logger.info("📅 Scheduling Slack response", 
-                           urgency_level=urgency_level,
-                           delay_seconds=delay_seconds,
-                           send_time=send_time.strftime("%H:%M:%S"),
-                           channel_id=message.get("channel"),
-                           message_preview=response[:100])
-            
-            # Programar la tarea asíncrona
-            task = asyncio.create_task(
-                self._send_delayed_response(
-                    message, response, team_id, delay_seconds
-                )
-            )
-            
-            self.logger.info("📋 Task created successfully", 
-                           task_id=id(task),
-                           delay_seconds=delay_seconds)
-            
-        except Exception as e:
-            self.logger.error("Error scheduling response", 
-                            error=str(e), 
-                            urgency_level=urgency_level)
+        # Determinar delay según urgencia (cualquier otra cuenta como low)
+        delay_seconds = self._delay_by_urgency.get(urgency_level, self._delay_by_urgency["low"])
+        # Las de alta urgencia salen sin esperar a agruparse con otras
+        self._schedule("urgency", message, response, team_id, delay_seconds,
+                       coalesce=urgency_level != "high", urgency_level=urgency_level)
     
     def schedule_test_response(self, message: Dict[str, Any], response: str, 
                              team_id: str, delay_seconds: int = None) -> None:
         """
         Programa una respuesta de prueba con delay personalizado.
         """
-        try:
-            # Usar configuración del .env si no se especifica delay
-            if delay_seconds is None:
-                delay_seconds = settings.RESPONSE_DELAY_TEST
-            
-            # Calcular tiempo de envío
-            send_time = datetime.now(timezone.utc) + timedelta(seconds=delay_seconds)
-            
-            self.logger.info("🧪 Scheduling test response", 
-                           delay_seconds=delay_seconds,
-                           send_time=send_time.strftime("%H:%M:%S"),
-                           channel_id=message.get("channel"),
-                           message_preview=response[:100])
-            
-            # Programar la tarea asíncrona
-            task = asyncio.create_task(
-                self._send_delayed_response(
-                    message, response, team_id, delay_seconds
-                )
-            )
-            
-            self.logger.info("🧪 Test task created successfully", 
-                           task_id=id(task),
-                           delay_seconds=delay_seconds)
-            
-        except Exception as e:
-            self.logger.error("Error scheduling test response", 
-                            error=str(e))
+        # Usar configuración del .env si no se especifica delay
+        delay_seconds = self._delay_test if delay_seconds is None else delay_seconds
+        self._schedule("test", message, response, team_id, delay_seconds)
     
     def schedule_loco_response(self, message: Dict[str, Any], response: str, 
                              team_id: str) -> None:
         """
         Programa una respuesta específica para mensajes con "loco".
         """
+        self._schedule("loco", message, response, team_id, self._delay_loco)
+    
+    def _schedule(self, kind: str, message: Dict[str, Any], response: str, 
+                  team_id: str, delay_seconds: int, coalesce: bool = False,
+                  **log_fields: Any) -> None:
+        """
+        Encola una respuesta en el scheduler compartido.
+        kind elige los mensajes de log en _SCHEDULE_LOGS; log_fields se agregan a los logs.
+        Con coalesce, la respuesta puede enviarse junto con otras al mismo canal/hilo.
+        """
+        scheduling_msg, queued_msg, error_msg = _SCHEDULE_LOGS[kind]
         try:
-            delay_seconds = settings.RESPONSE_DELAY_LOCO  # Delay configurado para "loco"
+            channel_id, thread_ts = message.get("channel"), message.get("thread_ts")
             
-            # Calcular tiempo de envío
-            send_time = datetime.now(timezone.utc) + timedelta(seconds=delay_seconds)
+            if self.logger.isEnabledFor(logging.DEBUG):
+                # Hora de envío y preview solo para debug
+                send_time = datetime.now(timezone.utc) + timedelta(seconds=delay_seconds)
+                self.logger.debug(scheduling_msg, 
+                                delay_seconds=delay_seconds,
+                                send_time=send_time.strftime("%H:%M:%S"),
+                                channel_id=channel_id,
+                                message_preview=response[:100],
+                                **log_fields)
             
-            self.logger.info("🎯 Scheduling 'loco' response", 
-                           delay_seconds=delay_seconds,
-                           send_time=send_time.strftime("%H:%M:%S"),
-                           channel_id=message.get("channel"),
-                           message_preview=response[:100])
-            
-            # Programar la tarea asíncrona
-            task = asyncio.create_task(
-                self._send_delayed_response(
-                    message, response, team_id, delay_seconds
-                )
-            )
+            # Encolar en el scheduler compartido
+            if coalesce and self._coalesce_window > 0:
+                self._enqueue(delay_seconds, lambda: self._send_coalesced_response(
+                    channel_id, response, thread_ts, team_id
+                ))
+            else:
+                self._enqueue(delay_seconds, lambda: self._send_slack_response(
+                    channel_id, response, thread_ts, team_id
+                ))
             
-            self.logger.info("🎯 'Loco' task created successfully", 
-                           task_id=id(task),
-                           delay_seconds=delay_seconds)
+            self.logger.info(queued_msg, 
+                           pending=len(self._pending),
+                           delay_seconds=delay_seconds,
+                           **log_fields)
             
         except Exception as e:
-            self.logger.error("Error scheduling 'loco' response", 
-                            error=str(e))
+            self.logger.error(error_msg, 
+                            error=str(e),
+                            **log_fields)
+    
+    def _enqueue(self, delay_seconds: int, send: Callable[[], Awaitable[bool]]) -> None:
+        """
+        Programa el envío con un timer del loop (loop.call_later): al vencer
+        se lanza directamente la tarea de envío, sin una tarea dormida por respuesta.
+        """
+        cls = SlackResponseScheduler
+        loop = asyncio.get_running_loop()
+        
+        def fire() -> None:
+            cls._pending.discard(handle)
+            task = loop.create_task(send())
+            cls._sending.add(task)
+            task.add_done_callback(cls._sending.discard)
+        
+        handle = loop.call_later(delay_seconds, fire)
+        cls._pending.add(handle)
     
-    async def _send_delayed_response(self, message: Dict[str, Any], 
-                                   response: str, team_id: str, 
-                                   delay_seconds: int) -> None:
+    @classmethod
+    async def aclose(cls) -> None:
         """
-        Envía la respuesta después del delay programado.
+        Cancela los envíos programados (se llama al apagar la aplicación).
+        Las respuestas cuyo timer no venció se descartan; los envíos en curso se
+        esperan, así terminan antes de que se cierre el cliente HTTP compartido.
         """
+        for handle in cls._pending:
+            handle.cancel()
+        cls._pending.clear()
+        loop = asyncio.get_running_loop()
+        sending = [task for task in cls._sending if task.get_loop() is loop]
+        if sending:
+            await asyncio.gather(*sending, return_exceptions=True)
+    
+    async def _send_coalesced_response(self, channel_id: str, response: str, 
+                                       thread_ts: Optional[str], team_id: str) -> bool:
+        """
+        Agrupa las respuestas al mismo canal/hilo que vencen dentro de la ventana
+        de agrupación: la primera espera la ventana y las envía todas en un único
+        chat.postMessage; las siguientes solo se agregan a la suya.
+        """
+        key = (channel_id, thread_ts)
+        outbox = SlackResponseScheduler._outbox
+        texts = outbox.get(key)
+        if texts is not None:
+            texts.append(response)
+            return True
+        
+        outbox[key] = texts = [response]
         try:
-            self.logger.info("⏰ Starting delayed response task", 
-                           delay_seconds=delay_seconds,
-                           channel_id=message.get("channel"))
-            
-            # Esperar el tiempo programado
-            self.logger.info("😴 Sleeping for delay", delay_seconds=delay_seconds)
-            await asyncio.sleep(delay_seconds)
-            self.logger.info("✅ Delay completed, sending response")
-            
-            # Enviar la respuesta
-            success = await self._send_slack_response(
-                message.get("channel"),
-                response,
-                message.get("thread_ts"),
-                team_id
-            )
-            
-            if success:
-                self.logger.info("✅ Delayed response sent successfully", 
-                               channel_id=message.get("channel"),
-                               delay_seconds=delay_seconds)
-            else:
-                self.logger.error("❌ Failed to send delayed response", 
-                                channel_id=message.get("channel"))
-                
-        except Exception as e:
-            self.logger.error("Error in delayed response", 
-                            error=str(e),
-                            channel_id=message.get("channel"))
+            await asyncio.sleep(self._coalesce_window)
+        finally:
+            outbox.pop(key, None)
+        
+        if len(texts) > 1:
+            self.logger.info("Coalesced Slack responses", 
+                           channel_id=channel_id,
+                           responses=len(texts))
+        return await self._send_slack_response(channel_id, "\n".join(texts), thread_ts, team_id)
     
     async def _send_slack_response(self, channel_id: str, response: str, 
                                  thread_ts: Optional[str], team_id: str) -> bool:
@@ -175,12 +201,8 @@ class SlackResponseScheduler(LoggerMixin):
         Envía la respuesta a Slack usando la API.
         """
         try:
-            import httpx
-            from app.core.config import settings
-            
             # Usar el token personal para enviar mensajes
-            access_token = settings.SLACK_PERSONAL_TOKEN
-            if not access_token:
+            if not settings.SLACK_PERSONAL_TOKEN:
                 self.logger.error("No Slack token configured for sending messages")
                 return False
             
@@ -194,40 +216,37 @@ class SlackResponseScheduler(LoggerMixin):
             if thread_ts:
                 data["thread_ts"] = thread_ts
             
-            self.logger.info("📤 Sending response to Slack", 
-                           channel_id=channel_id,
-                           thread_ts=thread_ts,
-                           response_length=len(response),
-                           response_preview=response[:100])
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("📤 Sending response to Slack", 
+                                channel_id=channel_id,
+                                thread_ts=thread_ts,
+                                response_length=len(response),
+                                response_preview=response[:100])
+            
+            # Enviar mensaje usando el cliente compartido de la API de Slack
+            response_api = await get_slack_client().post(
+                _POST_MESSAGE_URL,
+                headers=_POST_MESSAGE_HEADERS,
+                content=orjson.dumps(data)
+            )
             
-            # Enviar mensaje usando la API de Slack
-            async with httpx.AsyncClient() as client:
-                response_api = await client.post(
-                    "https://slack.com/api/chat.postMessage",
-                    headers={
-                        "Authorization": f"Bearer {access_token}",
-                        "Content-Type": "application/json"
-                    },
-                    json=data
-                )
-                
-                if response_api.status_code == 200:
-                    result = response_api.json()
-                    if result.get("ok"):
-                        self.logger.info("✅ Message sent successfully to Slack", 
-                                       channel_id=channel_id,
-                                       ts=result.get("ts"))
-                        return True
-                    else:
-                        self.logger.error("❌ Slack API error", 
-                                        error=result.get("error"),
-                                        channel_id=channel_id)
-                        return False
+            if response_api.status_code == 200:
+                result = orjson.loads(response_api.content)
+                if result.get("ok"):
+                    self.logger.info("✅ Message sent successfully to Slack", 
+                                   channel_id=channel_id,
+                                   ts=result.get("ts"))
+                    return True
                 else:
-                    self.logger.error("❌ HTTP error sending to Slack", 
-                                    status_code=response_api.status_code,
+                    self.logger.error("❌ Slack API error", 
+                                    error=result.get("error"),
                                     channel_id=channel_id)
                     return False
+            else:
+                self.logger.error("❌ HTTP error sending to Slack", 
+                                status_code=response_api.status_code,
+                                channel_id=channel_id)
+                return False
             
         except Exception as e:
             self.logger.error("Error sending Slack response", 
@@ -240,7 +259,7 @@ class SlackResponseScheduler(LoggerMixin):
         """
         Obtiene información sobre el tiempo de respuesta para una urgencia.
         """
-        time_range = self.response_times.get(urgency_level, self.response_times["none"])
+        time_range = _RESPONSE_TIMES.get(urgency_level, _RESPONSE_TIMES["none"])
         return {
             "urgency_level": urgency_level,
             "min_minutes": time_range["min"],
@@ -250,10 +269,4 @@ class SlackResponseScheduler(LoggerMixin):
     
     def _get_urgency_description(self, urgency_level: str) -> str:
         """Obtiene descripción de la urgencia."""
-        descriptions = {
-            "high": "Respuesta inmediata (1-5 minutos)",
-            "medium": "Respuesta rápida (5-10 minutos)", 
-            "low": "Respuesta normal (10-15 minutos)",
-            "none": "Respuesta cuando sea posible (20-30 minutos)"
-        }
-        return descriptions.get(urgency_level, "Tiempo no definido") 
\ No newline at end of file
+        return _URGENCY_DESCRIPTIONS.get(urgency_level, "Tiempo no definido") 
\ No newline at end of file
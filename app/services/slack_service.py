@@ -1,13 +1,24 @@
+import asyncio
+import logging
 from typing import Dict, Any, Optional
 from sqlmodel import Session
 
-from app.crud.slack_message import create_slack_message, get_slack_message_by_id, get_slack_messages
-from app.models import SlackMessageCreate
+from app.crud.slack_message import create_slack_message_if_new, get_slack_messages
+from app.models import SlackMessageCreate, compact_raw_event
 from app.services.ai_service import AIService
 from app.services.slack_response_scheduler import SlackResponseScheduler
 from app.services.slack_user_service import SlackUserService
+from app.core.config import settings
 from app.core.logging import LoggerMixin
 
+# Subtipos de mensaje que no se procesan
+_IGNORED_SUBTYPES: frozenset[str] = frozenset({
+    "message_deleted", 
+    "message_changed", 
+    "channel_join", 
+    "bot_message"
+})
+
 
 class SlackService(LoggerMixin):
     def __init__(self, session: Session):
@@ -21,101 +32,102 @@ class SlackService(LoggerMixin):
         Procesa un evento de mensaje de Slack y lo persiste en la base de datos.
         Retorna True si se procesó correctamente, False en caso contrario.
         """
+        # Extraer una sola vez los datos del mensaje
+        event_type = event.get("type", "message")
+        subtype = event.get("subtype")
+        timestamp = event.get("ts", "")
+        client_msg_id = event.get("client_msg_id")
+        slack_message_id = client_msg_id or timestamp
+        channel_id = event.get("channel", "unknown")
+        user_id = event.get("user", "unknown")
+        text = event.get("text", "")
+        text_lower = text.lower()
+        thread_ts = event.get("thread_ts")
+        parent_user_id = event.get("parent_user_id")
+        
         try:
             # Log del mensaje que se está procesando
             self.logger.info("Processing Slack message", 
-                           event_type=event.get("type"),
-                           event_subtype=event.get("subtype"),
-                           channel_id=event.get("channel"),
-                           user_id=event.get("user"),
-                           text=event.get("text", ""),
-                           full_event=event)
-            
-            # Extraer datos del mensaje
-            slack_message_id = event.get("client_msg_id") or event.get("ts")
-            channel_id = event.get("channel", "unknown")
-            user_id = event.get("user", "unknown")
-            text = event.get("text", "")
-            timestamp = event.get("ts", "")
-            thread_ts = event.get("thread_ts")
-            parent_user_id = event.get("parent_user_id")
-            client_msg_id = event.get("client_msg_id")
+                           event_type=event_type,
+                           event_subtype=subtype,
+                           channel_id=channel_id,
+                           user_id=user_id)
             
-            # Procesar menciones de usuario si tenemos access_token
-            processed_text = text
-            if access_token:
+            # Procesar menciones de usuario solo si tenemos access_token
+            # (sin token no se toca user_service ni se suspende la corrutina)
+            if not access_token:
+                processed_text = text
+            else:
                 try:
                     processed_text = await self.user_service.process_message_text(text, access_token)
-                    self.logger.info("Processed user mentions", 
-                                   original_text=text[:100],
-                                   processed_text=processed_text[:100])
+                    if self.logger.isEnabledFor(logging.DEBUG):
+                        self.logger.debug("Processed user mentions", 
+                                        original_text=text[:100],
+                                        processed_text=processed_text[:100])
                 except Exception as e:
                     self.logger.warning("Failed to process user mentions, using original text", error=str(e))
                     processed_text = text
             
-            # Verificar si el mensaje ya existe para evitar duplicados
-            existing_message = get_slack_message_by_id(
-                session=self.session, 
-                slack_message_id=slack_message_id
-            )
-            if existing_message:
-                self.logger.info("Message already exists, skipping", 
-                               slack_message_id=slack_message_id)
-                return True
-
-            # Crear objeto para persistir
-            slack_message_data = SlackMessageCreate(
+            # Crear objeto para persistir (sin validación: los campos vienen del payload de Slack)
+            slack_message_data = SlackMessageCreate.model_construct(
                 slack_message_id=slack_message_id,
                 team_id=team_id,
                 channel_id=channel_id,
                 user_id=user_id,
                 text=processed_text,  # Usar texto procesado con nombres reales
-                message_type=event.get("type", "message"),
-                subtype=event.get("subtype"),
+                message_type=event_type,
+                subtype=subtype,
                 timestamp=timestamp,
                 thread_ts=thread_ts,
                 parent_user_id=parent_user_id,
                 client_msg_id=client_msg_id,
                 is_bot=bool(event.get("bot_id")),
-                files=event.get("files", []),
-                blocks=event.get("blocks", []),
-                reactions=event.get("reactions", []),
+                files=event.get("files") or [],
+                blocks=event.get("blocks") or [],
+                reactions=event.get("reactions") or [],
                 edited=event.get("edited"),
                 reply_count=event.get("reply_count"),
                 reply_users_count=event.get("reply_users_count"),
                 latest_reply=event.get("latest_reply"),
                 subscribed=event.get("subscribed"),
-                raw_event=event
+                raw_event=compact_raw_event(event) if settings.STORE_RAW_EVENT else None
             )
 
-            # Persistir el mensaje
-            created_message = create_slack_message(
+            # Persistir el mensaje; si ya existe (ON CONFLICT DO NOTHING) no se reprocesa
+            message_id = create_slack_message_if_new(
                 session=self.session, 
                 slack_message_in=slack_message_data
             )
-            self.logger.info("Message persisted successfully", 
-                           message_id=created_message.id,
-                           slack_message_id=slack_message_id)
+            if message_id is None:
+                self.logger.info("Message already exists, skipping", 
+                               slack_message_id=slack_message_id)
+                return True
+            self.logger.debug("Message persisted successfully", 
+                            message_id=message_id,
+                            slack_message_id=slack_message_id)
+            
+            # Eventos que no se deben procesar (bots, ediciones, borrados...) se guardan
+            # pero no pasan por la IA, aunque el llamador no los haya filtrado
+            if not self.should_process_event(event):
+                return True
             
             # Obtener contexto de conversación reciente del mismo canal
+            # (sin el mensaje actual, excluido en la consulta)
             conversation_context = get_slack_messages(
                 session=self.session,
                 channel_id=channel_id,
-                limit=5  # Últimos 5 mensajes para contexto
+                limit=5,  # Últimos 5 mensajes para contexto
+                exclude_slack_message_id=slack_message_id
             )
             
-            # Filtrar para excluir el mensaje actual
-            conversation_context = [msg for msg in conversation_context if msg.slack_message_id != slack_message_id]
-            
-            # Crear una copia del evento con el texto procesado para el AI
-            ai_event = event.copy()
-            ai_event["text"] = processed_text  # Usar texto procesado con nombres reales
-            
-            # Analizar mensaje con IA y generar respuesta si es necesario
-            analysis = self.ai_service.analyze_message(ai_event, conversation_context)
-            self.logger.info("AI analysis completed", 
-                           analysis=analysis,
-                           slack_message_id=slack_message_id)
+            # Analizar mensaje con IA (con el texto procesado, nombres reales) y generar respuesta si es necesario.
+            # El workflow llama al LLM de forma bloqueante: se ejecuta en un thread para no frenar el event loop
+            analysis = await asyncio.to_thread(
+                self.ai_service.analyze_message, event, conversation_context, text=processed_text
+            )
+            self.logger.debug("AI analysis completed", 
+                            analysis=analysis,
+                            slack_message_id=slack_message_id)
             
             # Verificar si debe responder y generar respuesta
             if self.ai_service.should_respond(analysis):
@@ -125,18 +137,19 @@ class SlackService(LoggerMixin):
                                slack_message_id=slack_message_id)
                 
                 # Generar respuesta usando el flujo completo de LangGraph
-                response = self.ai_service.get_response(ai_event, conversation_context)
+                response = await asyncio.to_thread(
+                    self.ai_service.get_response, event, conversation_context, text=processed_text
+                )
                 if response:
-                    self.logger.info("Response generated successfully", 
-                                   response=response,
-                                   slack_message_id=slack_message_id)
+                    self.logger.debug("Response generated successfully", 
+                                    response=response,
+                                    slack_message_id=slack_message_id)
                     
                     # Obtener nivel de urgencia del análisis
                     urgency_level = analysis.get('urgency', 'low')
                     
                     # Verificar si es respuesta para "loco" y usar delay específico
-                    message_text = event.get('text', '').lower()
-                    if "loco" in message_text:
+                    if "loco" in text_lower:
                         # Usar delay específico de 5 segundos para "loco"
                         self.response_scheduler.schedule_loco_response(
                             message=event,
@@ -176,84 +189,83 @@ class SlackService(LoggerMixin):
         Versión síncrona del procesamiento de mensajes (sin procesamiento de menciones).
         Mantiene compatibilidad con código existente.
         """
+        # Extraer una sola vez los datos del mensaje
+        event_type = event.get("type", "message")
+        subtype = event.get("subtype")
+        timestamp = event.get("ts", "")
+        client_msg_id = event.get("client_msg_id")
+        slack_message_id = client_msg_id or timestamp
+        channel_id = event.get("channel", "unknown")
+        user_id = event.get("user", "unknown")
+        text = event.get("text", "")
+        thread_ts = event.get("thread_ts")
+        parent_user_id = event.get("parent_user_id")
+        
         try:
             # Log del mensaje que se está procesando
             self.logger.info("Processing Slack message (sync)", 
-                           event_type=event.get("type"),
-                           event_subtype=event.get("subtype"),
-                           channel_id=event.get("channel"),
-                           user_id=event.get("user"),
-                           text=event.get("text", ""))
-            
-            # Extraer datos del mensaje
-            slack_message_id = event.get("client_msg_id") or event.get("ts")
-            channel_id = event.get("channel", "unknown")
-            user_id = event.get("user", "unknown")
-            text = event.get("text", "")
-            timestamp = event.get("ts", "")
-            thread_ts = event.get("thread_ts")
-            parent_user_id = event.get("parent_user_id")
-            client_msg_id = event.get("client_msg_id")
+                           event_type=event_type,
+                           event_subtype=subtype,
+                           channel_id=channel_id,
+                           user_id=user_id)
             
-            # Verificar si el mensaje ya existe para evitar duplicados
-            existing_message = get_slack_message_by_id(
-                session=self.session, 
-                slack_message_id=slack_message_id
-            )
-            if existing_message:
-                self.logger.info("Message already exists, skipping", 
-                               slack_message_id=slack_message_id)
-                return True
-
-            # Crear objeto para persistir (sin procesar menciones)
-            slack_message_data = SlackMessageCreate(
+            # Crear objeto para persistir (sin procesar menciones ni validación)
+            slack_message_data = SlackMessageCreate.model_construct(
                 slack_message_id=slack_message_id,
                 team_id=team_id,
                 channel_id=channel_id,
                 user_id=user_id,
                 text=text,  # Usar texto original
-                message_type=event.get("type", "message"),
-                subtype=event.get("subtype"),
+                message_type=event_type,
+                subtype=subtype,
                 timestamp=timestamp,
                 thread_ts=thread_ts,
                 parent_user_id=parent_user_id,
                 client_msg_id=client_msg_id,
                 is_bot=bool(event.get("bot_id")),
-                files=event.get("files", []),
-                blocks=event.get("blocks", []),
-                reactions=event.get("reactions", []),
+                files=event.get("files") or [],
+                blocks=event.get("blocks") or [],
+                reactions=event.get("reactions") or [],
                 edited=event.get("edited"),
                 reply_count=event.get("reply_count"),
                 reply_users_count=event.get("reply_users_count"),
                 latest_reply=event.get("latest_reply"),
                 subscribed=event.get("subscribed"),
-                raw_event=event
+                raw_event=compact_raw_event(event) if settings.STORE_RAW_EVENT else None
             )
 
-            # Persistir el mensaje
-            created_message = create_slack_message(
+            # Persistir el mensaje; si ya existe (ON CONFLICT DO NOTHING) no se reprocesa
+            message_id = create_slack_message_if_new(
                 session=self.session, 
                 slack_message_in=slack_message_data
             )
-            self.logger.info("Message persisted successfully", 
-                           message_id=created_message.id,
-                           slack_message_id=slack_message_id)
+            if message_id is None:
+                self.logger.info("Message already exists, skipping", 
+                               slack_message_id=slack_message_id)
+                return True
+            self.logger.debug("Message persisted successfully", 
+                            message_id=message_id,
+                            slack_message_id=slack_message_id)
+            
+            # Eventos que no se deben procesar (bots, ediciones, borrados...) se guardan
+            # pero no pasan por la IA, aunque el llamador no los haya filtrado
+            if not self.should_process_event(event):
+                return True
             
             # Obtener contexto de conversación reciente del mismo canal
+            # (sin el mensaje actual, excluido en la consulta)
             conversation_context = get_slack_messages(
                 session=self.session,
                 channel_id=channel_id,
-                limit=5  # Últimos 5 mensajes para contexto
+                limit=5,  # Últimos 5 mensajes para contexto
+                exclude_slack_message_id=slack_message_id
             )
             
-            # Filtrar para excluir el mensaje actual
-            conversation_context = [msg for msg in conversation_context if msg.slack_message_id != slack_message_id]
-            
             # Analizar mensaje con IA y generar respuesta si es necesario
-            analysis = self.ai_service.analyze_message(event, conversation_context)
-            self.logger.info("AI analysis completed", 
-                           analysis=analysis,
-                           slack_message_id=slack_message_id)
+            analysis = self.ai_service.analyze_message(event, conversation_context, text=text)
+            self.logger.debug("AI analysis completed", 
+                            analysis=analysis,
+                            slack_message_id=slack_message_id)
             
             # Verificar si debe responder y generar respuesta
             if self.ai_service.should_respond(analysis):
@@ -263,11 +275,11 @@ class SlackService(LoggerMixin):
                                slack_message_id=slack_message_id)
                 
                 # Generar respuesta usando el flujo completo de LangGraph
-                response = self.ai_service.get_response(event, conversation_context)
+                response = self.ai_service.get_response(event, conversation_context, text=text)
                 if response:
-                    self.logger.info("Response generated successfully", 
-                                   response=response,
-                                   slack_message_id=slack_message_id)
+                    self.logger.debug("Response generated successfully", 
+                                    response=response,
+                                    slack_message_id=slack_message_id)
                     
                     # Obtener nivel de urgencia del análisis
                     urgency_level = analysis.get('urgency', 'low')
@@ -296,29 +308,17 @@ class SlackService(LoggerMixin):
                             exc_info=True)
             return False
 
-    def should_process_event(self, event: Dict[str, Any]) -> bool:
+    @staticmethod
+    def should_process_event(event: Dict[str, Any]) -> bool:
         """
         Determina si un evento debe ser procesado basado en su tipo y subtipo.
         """
-        # Solo procesar mensajes de tipo "message"
-        if event.get("type") != "message":
-            return False
-
-        # Ignorar subtipos no deseados
-        ignored_subtypes = [
-            "message_deleted", 
-            "message_changed", 
-            "channel_join", 
-            "bot_message"
-        ]
-        if event.get("subtype") in ignored_subtypes:
-            return False
-
-        # Ignorar mensajes de bots
-        if event.get("bot_id"):
-            return False
-
-        return True
+        # Solo mensajes de tipo "message", sin subtipos ignorados y que no sean de bots
+        return (
+            event.get("type") == "message"
+            and event.get("subtype") not in _IGNORED_SUBTYPES
+            and not event.get("bot_id")
+        )
 
     def get_messages(
         self,
@@ -1,21 +1,97 @@
+import asyncio
+import logging
+import random
 import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List, Tuple
 import httpx
-from typing import Dict, Any, Optional, List
+import orjson
 from sqlmodel import Session
 
 from app.core.config import settings
-from app.core.logging import LoggerMixin
+from app.core.db import engine
+from app.core.exceptions import DatabaseException
+from app.core.http import get_slack_client
+from app.crud.slack_user import get_fresh_slack_users, upsert_slack_users
+from app.core.logging import get_logger
 
+logger = get_logger(__name__)
 
-class SlackUserService(LoggerMixin):
-    """Servicio para manejar información de usuarios de Slack con cache en memoria."""
+# Menciones de usuario (<@U1234567890>) y de canal (<#C1234567890|general>),
+# en una sola pasada: grupo 1 = usuario; grupos 2 y 3 = id y nombre del canal
+_MENTION_OR_CHANNEL_RE = re.compile(r'<@([A-Z0-9]+)>|<#([A-Z0-9]+)\|([^>]+)>')
+
+# Campos del perfil que se usan para mostrar el nombre del usuario
+_PROFILE_NAME_FIELDS = ("first_name", "display_name", "real_name")
+
+
+def _compact_user_info(user_info: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Reduce el usuario de users.info (varios KB: imágenes, zona horaria, etc.) a los
+    campos de nombre que se usan, con la misma forma {"name", "profile": {...}}.
+    Agrega mention_name, el nombre con el que se reemplazan sus menciones, calculado
+    una sola vez al cachear en lugar de en cada mención.
+    """
+    profile = user_info.get("profile") or {}
+    name = user_info.get("name")
+    return {
+        "name": name,
+        "profile": {field: profile.get(field) for field in _PROFILE_NAME_FIELDS},
+        # Usar first_name como prioridad, sino name (username), sino display_name, sino real_name
+        "mention_name": (profile.get("first_name") or name or 
+                         profile.get("display_name") or profile.get("real_name"))
+    }
+
+
+class SlackUserService:
+    """
+    Servicio para manejar información de usuarios de Slack con cache en memoria
+    y, como segundo nivel compartido entre workers, la tabla slack_users.
+    """
+    
+    # Cache en memoria compartido entre instancias (el servicio se crea por request),
+    # LRU acotado a USER_CACHE_MAX_SIZE: {user_id: (expira_en, user_info)}.
+    # user_info None marca un usuario no encontrado, así un hit es una sola búsqueda.
+    # Los perfiles cambian poco: 6 horas de vida; los no encontrados, 15 minutos
+    # (un usuario desactivado puede volver)
+    USER_CACHE_TTL_SECONDS = 6 * 3600
+    USER_NOT_FOUND_TTL_SECONDS = 15 * 60
+    USER_CACHE_MAX_SIZE = 10000
+    _user_cache: "OrderedDict[str, tuple]" = OrderedDict()
+    # Consultas a users.info en curso: las llamadas concurrentes por el mismo
+    # usuario esperan la misma en lugar de repetirla
+    _inflight: Dict[str, asyncio.Task] = {}
+    
+    # Reintentos de users.info ante 429 (respetando Retry-After, con tope), 5xx y errores de red
+    USER_INFO_MAX_ATTEMPTS = 4
+    USER_INFO_MAX_RETRY_AFTER_SECONDS = 10.0
     
     def __init__(self, session: Session):
         self.session = session
-        # Cache en memoria: {user_id: user_info}
-        self._user_cache: Dict[str, Dict[str, Any]] = {}
-        # Cache de usuarios no encontrados para evitar llamadas repetidas
-        self._not_found_cache: set = set()
+    
+    def peek_user(self, user_id: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Busca un usuario solo en el cache en memoria, sin await.
+        
+        Returns:
+            (hit, user_info): hit indica si el usuario está vigente en cache;
+            user_info es None si está marcado como no encontrado
+        """
+        cached = self._user_cache.get(user_id)
+        if cached:
+            if cached[0] > time.monotonic():
+                self._user_cache.move_to_end(user_id)
+                if logger.isEnabledFor(logging.DEBUG):
+                    if cached[1] is None:
+                        logger.debug("User marked as not found in cache", user_id=user_id)
+                    else:
+                        logger.debug("User info found in memory cache", user_id=user_id)
+                return True, cached[1]
+            # Expirado: se descarta y se vuelve a consultar
+            del self._user_cache[user_id]
+        return False, None
     
     async def get_user_info(self, user_id: str, access_token: str) -> Optional[Dict[str, Any]]:
         """
@@ -28,57 +104,208 @@ class SlackUserService(LoggerMixin):
         Returns:
             Diccionario con información del usuario o None si no se encuentra
         """
-        # 1. Verificar cache en memoria primero
-        if user_id in self._user_cache:
-            self.logger.debug("User info found in memory cache", user_id=user_id)
-            return self._user_cache[user_id]
+        # 1. Verificar cache en memoria primero (incluye los ya marcados como no encontrados)
+        hit, user_info = self.peek_user(user_id)
+        if hit:
+            return user_info
         
-        # 2. Verificar si ya sabemos que no existe
-        if user_id in self._not_found_cache:
-            self.logger.debug("User marked as not found in cache", user_id=user_id)
-            return None
-        
-        # 3. Si no está en cache, obtener de la API de Slack
+        # 2. Si no está en cache, obtener de la API de Slack
         if not access_token:
-            self.logger.warning("No access token provided, cannot fetch user info from Slack", user_id=user_id)
+            logger.warning("No access token provided, cannot fetch user info from Slack", user_id=user_id)
             return None
         
+        # Una sola consulta por usuario a la vez (single-flight)
+        inflight = self._inflight.get(user_id)
+        if inflight is None or inflight.get_loop() is not asyncio.get_running_loop():
+            inflight = asyncio.ensure_future(self._fetch_user_info(user_id, access_token))
+            self._inflight[user_id] = inflight
+            inflight.add_done_callback(lambda _: self._inflight.pop(user_id, None))
+        # shield: cancelar a uno de los que esperan no cancela la consulta de los demás
+        return await asyncio.shield(inflight)
+    
+    async def _fetch_user_info(self, user_id: str, access_token: str) -> Optional[Dict[str, Any]]:
+        """
+        Consulta users.info y guarda el resultado en el cache en memoria.
+        """
         try:
-            async with httpx.AsyncClient() as client:
+            response = await self._request_user_info(user_id, access_token)
+            
+            now = time.monotonic()
+            if response.status_code == 200:
+                data = orjson.loads(response.content)
+                if data.get("ok"):
+                    # Solo los campos de nombre: el resto del payload no se usa
+                    user_info = _compact_user_info(data.get("user") or {})
+                    
+                    # Cachear en memoria para acceso futuro
+                    self._cache_put(self._user_cache, user_id, (now + self.USER_CACHE_TTL_SECONDS, user_info))
+                    logger.info("User info cached in memory", 
+                                   user_id=user_id, name=user_info.get("name"))
+                    return user_info
+                else:
+                    error_msg = data.get("error", "unknown")
+                    logger.warning("Slack API error getting user info", 
+                                      user_id=user_id, error=error_msg)
+                    
+                    # Si es un error de usuario no encontrado, cachear como no encontrado
+                    if error_msg == "user_not_found":
+                        self._cache_put(self._user_cache, user_id, (now + self.USER_NOT_FOUND_TTL_SECONDS, None))
+                        logger.info("User marked as not found", user_id=user_id)
+            else:
+                logger.error("HTTP error getting user info", 
+                                user_id=user_id, status_code=response.status_code)
+                
+        except (httpx.HTTPError, asyncio.TimeoutError, orjson.JSONDecodeError) as e:
+            # Solo fallas de red/respuesta: los errores de programación se propagan
+            logger.warning("Error getting user info from Slack", 
+                           user_id=user_id, error_type=type(e).__name__)
+        
+        return None
+    
+    async def _request_user_info(self, user_id: str, access_token: str) -> httpx.Response:
+        """
+        GET a users.info con reintentos: ante 429 espera lo que indica Retry-After y
+        ante 5xx o errores de red usa backoff exponencial con jitter.
+        Devuelve la última respuesta obtenida.
+        """
+        # Cliente compartido de la API de Slack (conexiones keep-alive entre llamadas)
+        client = get_slack_client()
+        for attempt in range(self.USER_INFO_MAX_ATTEMPTS):
+            is_last_attempt = attempt == self.USER_INFO_MAX_ATTEMPTS - 1
+            try:
                 response = await client.get(
-                    "https://slack.com/api/users.info",
+                    "/users.info",
                     params={"user": user_id},
                     headers={"Authorization": f"Bearer {access_token}"}
                 )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if data.get("ok"):
-                        user_info = data.get("user", {})
-                        
-                        # Cachear en memoria para acceso futuro
-                        self._user_cache[user_id] = user_info
-                        self.logger.info("User info cached in memory", 
-                                       user_id=user_id, name=user_info.get("name"))
-                        return user_info
-                    else:
-                        error_msg = data.get("error", "unknown")
-                        self.logger.warning("Slack API error getting user info", 
-                                          user_id=user_id, error=error_msg)
-                        
-                        # Si es un error de usuario no encontrado, cachear como no encontrado
-                        if error_msg == "user_not_found":
-                            self._not_found_cache.add(user_id)
-                            self.logger.info("User marked as not found", user_id=user_id)
-                else:
-                    self.logger.error("HTTP error getting user info", 
-                                    user_id=user_id, status_code=response.status_code)
-                    
-        except Exception as e:
-            self.logger.error("Error getting user info from Slack", 
-                            user_id=user_id, error=str(e))
+            except httpx.TransportError as e:
+                if is_last_attempt:
+                    raise
+                logger.warning("Network error getting user info, retrying", 
+                                  user_id=user_id, attempt=attempt + 1, error_type=type(e).__name__)
+                await asyncio.sleep(self._backoff_seconds(attempt))
+                continue
+            
+            if is_last_attempt:
+                return response
+            if response.status_code == 429:
+                try:
+                    retry_after = float(response.headers.get("Retry-After", 1))
+                except ValueError:
+                    retry_after = 1.0
+                retry_after = min(retry_after, self.USER_INFO_MAX_RETRY_AFTER_SECONDS)
+                logger.warning("Slack rate limit getting user info, retrying", 
+                                  user_id=user_id, attempt=attempt + 1, retry_after=retry_after)
+                await asyncio.sleep(retry_after)
+            elif response.status_code >= 500:
+                logger.warning("Slack server error getting user info, retrying", 
+                                  user_id=user_id, attempt=attempt + 1, status_code=response.status_code)
+                await asyncio.sleep(self._backoff_seconds(attempt))
+            else:
+                return response
+    
+    @staticmethod
+    def _backoff_seconds(attempt: int) -> float:
+        """Backoff exponencial (0.1s, 0.2s, 0.4s...) con jitter."""
+        return 0.1 * 2 ** attempt + random.uniform(0, 0.05)
+    
+    @classmethod
+    def _cache_put(cls, cache: OrderedDict, user_id: str, value: Any) -> None:
+        """Guarda un valor en el cache LRU, expulsando el menos usado si se llena."""
+        cache[user_id] = value
+        cache.move_to_end(user_id)
+        if len(cache) > cls.USER_CACHE_MAX_SIZE:
+            cache.popitem(last=False)
+    
+    async def get_users_info_bulk(self, user_ids: List[str], access_token: str) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Obtiene la información de varios usuarios de Slack en una sola llamada.
+        users.info solo acepta un usuario por request: los IDs repetidos se consultan
+        una vez, los que están en cache se resuelven sin await y el resto se pide en paralelo.
         
-        return None
+        Args:
+            user_ids: IDs de usuario de Slack (pueden repetirse)
+            access_token: Token personal de Slack
+            
+        Returns:
+            Diccionario user_id -> información del usuario (o None si no se encuentra)
+        """
+        users_info: Dict[str, Optional[Dict[str, Any]]] = {}
+        pending = []
+        for user_id in dict.fromkeys(user_ids):
+            hit, user_info = self.peek_user(user_id)
+            if hit:
+                users_info[user_id] = user_info
+            else:
+                pending.append(user_id)
+        if not pending:
+            return users_info
+        
+        # Los que no están en memoria se buscan primero en el cache compartido (DB)
+        users_info.update(await self._load_shared_users(pending))
+        missing = [user_id for user_id in pending if user_id not in users_info]
+        if not missing:
+            return users_info
+        
+        user_infos = await asyncio.gather(
+            *(self.get_user_info(user_id, access_token) for user_id in missing)
+        )
+        fetched = dict(zip(missing, user_infos))
+        users_info.update(fetched)
+        
+        # Los obtenidos de Slack se guardan para el resto de los workers
+        await self._store_shared_users({
+            user_id: user_info for user_id, user_info in fetched.items() if user_info
+        })
+        return users_info
+    
+    async def _load_shared_users(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Completa el cache en memoria con los usuarios vigentes de la tabla slack_users.
+        Retorna los usuarios encontrados; el resto hay que pedirlos a Slack.
+        """
+        try:
+            # La consulta es bloqueante: se ejecuta en un thread para no frenar el event loop
+            shared = await asyncio.to_thread(self._read_shared_users, user_ids)
+        except DatabaseException as e:
+            logger.warning("Failed to read shared Slack user cache", error=str(e))
+            return {}
+        
+        now = time.monotonic()
+        utc_now = datetime.now(timezone.utc)
+        loaded = {}
+        for user_id, (user_info, fetched_at) in shared.items():
+            # Vence cuando vencería en la tabla, no USER_CACHE_TTL_SECONDS desde ahora
+            age = (utc_now - fetched_at).total_seconds()
+            loaded[user_id] = _compact_user_info(user_info)
+            self._cache_put(self._user_cache, user_id, (now + self.USER_CACHE_TTL_SECONDS - age, loaded[user_id]))
+        return loaded
+    
+    async def _store_shared_users(self, users: Dict[str, Dict[str, Any]]) -> None:
+        """Guarda en la tabla slack_users los usuarios obtenidos de la API de Slack."""
+        if not users:
+            return
+        try:
+            await asyncio.to_thread(self._write_shared_users, users)
+        except DatabaseException as e:
+            logger.warning("Failed to write shared Slack user cache", error=str(e))
+    
+    @classmethod
+    def _read_shared_users(cls, user_ids: List[str]) -> Dict[str, Tuple[Dict[str, Any], datetime]]:
+        """
+        Lee la tabla slack_users con su propia sesión (corre en un thread): el commit
+        o rollback del cache no toca la sesión del request.
+        """
+        with Session(engine) as session:
+            return get_fresh_slack_users(
+                session=session, user_ids=user_ids, max_age_seconds=cls.USER_CACHE_TTL_SECONDS
+            )
+    
+    @staticmethod
+    def _write_shared_users(users: Dict[str, Dict[str, Any]]) -> None:
+        """Escribe en la tabla slack_users con su propia sesión (corre en un thread)."""
+        with Session(engine) as session:
+            upsert_slack_users(session=session, users=users)
     
     def extract_user_mentions(self, text: str) -> List[str]:
         """
@@ -90,9 +317,22 @@ class SlackUserService(LoggerMixin):
         Returns:
             Lista de IDs de usuario mencionados
         """
-        # Patrón para menciones de usuario: <@U1234567890>
-        mention_pattern = r'<@([A-Z0-9]+)>'
-        mentions = re.findall(mention_pattern, text)
+        # Equivalente a re.findall(r'<@([A-Z0-9]+)>', text) pero con str.find,
+        # más barato para textos con pocas o ninguna mención
+        mentions = []
+        find = text.find
+        i = find('<@')
+        while i >= 0:
+            j = find('>', i + 2)
+            if j < 0:
+                break
+            user_id = text[i + 2:j]
+            # Solo A-Z y 0-9 (isupper exige al menos una letra; si no hay, todos dígitos)
+            if user_id.isascii() and user_id.isalnum() and (user_id.isupper() or user_id.isdigit()):
+                mentions.append(user_id)
+                i = find('<@', j + 1)
+            else:
+                i = find('<@', i + 2)
         return mentions
     
     def replace_user_mentions(self, text: str, user_info_map: Dict[str, str]) -> str:
@@ -108,19 +348,16 @@ class SlackUserService(LoggerMixin):
         """
         def replace_mention(match):
             user_id = match.group(1)
+            if user_id is None:
+                # Mención de canal: <#C123|general> -> #general
+                return f"#{match.group(3)}"
             if user_id in user_info_map:
                 return f"@{user_info_map[user_id]}"
-            else:
-                # Si no tenemos información del usuario, mantener la mención original
-                return match.group(0)
-        
-        # Reemplazar menciones de usuario
-        text = re.sub(r'<@([A-Z0-9]+)>', replace_mention, text)
+            # Si no tenemos información del usuario, mantener la mención original
+            return match.group(0)
         
-        # También reemplazar menciones de canal si las hay
-        text = re.sub(r'<#([A-Z0-9]+)\|([^>]+)>', r'#\2', text)
-        
-        return text
+        # Reemplazar menciones de usuario y de canal en una sola pasada
+        return _MENTION_OR_CHANNEL_RE.sub(replace_mention, text)
     
     async def process_message_text(self, text: str, access_token: str) -> str:
         """
@@ -133,7 +370,8 @@ class SlackUserService(LoggerMixin):
         Returns:
             Texto procesado con nombres reales
         """
-        if not text:
+        # Sin "<@" no hay menciones de usuario: no hace falta recorrer el texto
+        if not text or '<@' not in text:
             return text
         
         # Extraer menciones de usuario
@@ -142,38 +380,35 @@ class SlackUserService(LoggerMixin):
         if not user_mentions:
             return text
         
-        # Obtener información de todos los usuarios mencionados
-        user_info_map = {}
-        for user_id in user_mentions:
-            user_info = await self.get_user_info(user_id, access_token)
-            if user_info:
-                # Usar first_name como prioridad, sino name (username), sino display_name, sino real_name
-                display_name = (user_info.get("profile", {}).get("first_name") or 
-                              user_info.get("name") or 
-                              user_info.get("profile", {}).get("display_name") or 
-                              user_info.get("profile", {}).get("real_name") or 
-                              user_id)
-                user_info_map[user_id] = display_name
+        # Obtener información de todos los usuarios mencionados de una vez
+        users_info = await self.get_users_info_bulk(user_mentions, access_token)
+        
+        # mention_name se calcula al cachear (ver _compact_user_info)
+        user_info_map = {
+            user_id: user_info["mention_name"] or user_id
+            for user_id, user_info in users_info.items() if user_info
+        }
         
         # Reemplazar menciones en el texto
         processed_text = self.replace_user_mentions(text, user_info_map)
         
-        self.logger.info("Processed message text", 
-                        original_mentions=user_mentions,
-                        processed_mentions=list(user_info_map.values()),
-                        text_length=len(processed_text))
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Processed message text", 
+                            original_mentions=user_mentions,
+                            processed_mentions=list(user_info_map.values()),
+                            text_length=len(processed_text))
         
         return processed_text
     
     def clear_cache(self) -> None:
         """Limpia el cache en memoria."""
         self._user_cache.clear()
-        self._not_found_cache.clear()
-        self.logger.info("Memory cache cleared")
+        logger.info("Memory cache cleared")
     
     def get_cache_stats(self) -> Dict[str, int]:
         """Obtiene estadísticas del cache."""
+        not_found_users = sum(1 for _, user_info in self._user_cache.values() if user_info is None)
         return {
-            "cached_users": len(self._user_cache),
-            "not_found_users": len(self._not_found_cache)
+            "cached_users": len(self._user_cache) - not_found_users,
+            "not_found_users": not_found_users
         } 
\ No newline at end of file
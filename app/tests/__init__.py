@@ -0,0 +1,5 @@
+from app.tests.utils.db import use_worker_database
+
+# Se ejecuta antes de que conftest importe la app (y con ella el engine de
+# app.core.db): con pytest-xdist cada worker usa su propia base de datos
+use_worker_database()
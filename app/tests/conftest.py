@@ -1,13 +1,17 @@
 from collections.abc import Generator
+from unittest.mock import Mock
 
 import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session, delete
 
+from app.api.deps import get_slack_oauth_service, get_slack_service
 from app.core.config import settings
 from app.core.db import engine, init_db
 from app.main import app
 from app.models import Item, User
+from app.services.slack_oauth_service import SlackOAuthService
+from app.services.slack_service import SlackService
 from app.tests.utils.user import authentication_token_from_email
 from app.tests.utils.utils import get_superuser_token_headers
 
@@ -24,18 +28,52 @@ def db() -> Generator[Session, None, None]:
         session.commit()
 
 
-@pytest.fixture(scope="module")
+@pytest.fixture
+def rollback_db() -> Generator[Session, None, None]:
+    # Sesión dentro de una transacción que se deshace al terminar el test:
+    # los commit de los CRUD solo liberan un SAVEPOINT y nada queda en la base
+    connection = engine.connect()
+    transaction = connection.begin()
+    session = Session(bind=connection, join_transaction_mode="create_savepoint")
+    yield session
+    session.close()
+    transaction.rollback()
+    connection.close()
+
+
+@pytest.fixture(scope="session")
 def client() -> Generator[TestClient, None, None]:
+    # Un solo TestClient (y un solo arranque de la app) para toda la sesión
     with TestClient(app) as c:
         yield c
 
 
+@pytest.fixture
+def fake_slack_service() -> Generator[Mock, None, None]:
+    # SlackService inyectado en las rutas en lugar del real
+    # (con spec: los métodos async son AsyncMock y no se aceptan atributos inexistentes)
+    svc = Mock(spec=SlackService)
+    svc.process_message_event.return_value = True
+    app.dependency_overrides[get_slack_service] = lambda: svc
+    yield svc
+    app.dependency_overrides.pop(get_slack_service, None)
+
+
+@pytest.fixture
+def fake_oauth_service() -> Generator[Mock, None, None]:
+    # SlackOAuthService inyectado en las rutas en lugar del real
+    svc = Mock(spec=SlackOAuthService)
+    app.dependency_overrides[get_slack_oauth_service] = lambda: svc
+    yield svc
+    app.dependency_overrides.pop(get_slack_oauth_service, None)
+
+
 @pytest.fixture(scope="module")
 def superuser_token_headers(client: TestClient) -> dict[str, str]:
     return get_superuser_token_headers(client)
 
 
-@pytest.fixture(scope="module")
+@pytest.fixture(scope="session")
 def normal_user_token_headers(client: TestClient, db: Session) -> dict[str, str]:
     return authentication_token_from_email(
         client=client, email=settings.EMAIL_TEST_USER, db=db
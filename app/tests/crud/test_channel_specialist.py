@@ -0,0 +1,47 @@
+from sqlmodel import Session
+
+from app.crud.channel_specialist import get_active_channel_specialists
+from app.models import ChannelSpecialist
+
+
+class TestChannelSpecialistCRUD:
+    """Tests para las operaciones CRUD de especialistas del canal."""
+
+    def test_get_active_channel_specialists(self, rollback_db: Session):
+        """Test obtener solo los especialistas activos del canal."""
+        rollback_db.add_all([
+            ChannelSpecialist(
+                name="Especialista activo",
+                description="Activo",
+                expertise_keywords=["python"],
+                system_prompt="Prompt",
+                channel_id="C_SPECIALISTS"
+            ),
+            ChannelSpecialist(
+                name="Especialista inactivo",
+                description="Inactivo",
+                expertise_keywords=["java"],
+                system_prompt="Prompt",
+                is_active=False,
+                channel_id="C_SPECIALISTS"
+            ),
+            ChannelSpecialist(
+                name="Otro canal",
+                description="Otro canal",
+                expertise_keywords=["go"],
+                system_prompt="Prompt",
+                channel_id="C_OTHER"
+            ),
+        ])
+        rollback_db.commit()
+        
+        specialists = get_active_channel_specialists(session=rollback_db, channel_id="C_SPECIALISTS")
+        
+        assert [s.name for s in specialists] == ["Especialista activo"]
+        assert specialists[0].expertise_keywords == ["python"]
+
+    def test_get_active_channel_specialists_empty(self, rollback_db: Session):
+        """Test canal sin especialistas configurados."""
+        specialists = get_active_channel_specialists(session=rollback_db, channel_id="C_EMPTY")
+        
+        assert specialists == []
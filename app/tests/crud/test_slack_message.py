@@ -4,6 +4,8 @@ from sqlmodel import Session
 from app.core.exceptions import DatabaseException, ValidationException
 from app.crud.slack_message import (
     create_slack_message,
+    create_slack_message_if_new,
+    create_slack_messages,
     get_slack_message_by_id,
     get_slack_messages,
     update_slack_message,
@@ -12,11 +14,41 @@ from app.crud.slack_message import (
 )
 from app.models import SlackMessageCreate, SlackMessageUpdate
 
+# Campos comunes a los mensajes de prueba; cada test solo indica lo que cambia
+_BASE_MSG = {
+    "slack_message_id": "1234567890.123456",
+    "team_id": "T1234567890",
+    "channel_id": "C1234567890",
+    "user_id": "U1234567890",
+    "message_type": "message",
+    "timestamp": "1234567890.123456",
+}
+
+
+def _message_data(text: str, **overrides) -> SlackMessageCreate:
+    """Mensaje de prueba con los campos de _BASE_MSG y el raw_event correspondiente al texto."""
+    return SlackMessageCreate(**{
+        **_BASE_MSG,
+        "text": text,
+        "raw_event": {"type": "message", "text": text},
+        **overrides,
+    })
+
+
+def _numbered_message(i: int, **overrides) -> SlackMessageCreate:
+    """Mensaje de prueba número i (id y timestamp "1234567890.{i}")."""
+    return _message_data(
+        f"Test message {i}",
+        slack_message_id=f"1234567890.{i}",
+        timestamp=f"1234567890.{i}",
+        **overrides,
+    )
+
 
 class TestSlackMessageCRUD:
     """Tests para las operaciones CRUD de mensajes de Slack."""
 
-    def test_create_slack_message_success(self, db: Session):
+    def test_create_slack_message_success(self, rollback_db: Session):
         """Test crear mensaje de Slack exitosamente."""
         message_data = SlackMessageCreate(
             slack_message_id="1234567890.123456",
@@ -31,7 +63,7 @@ class TestSlackMessageCRUD:
             raw_event={"type": "message", "text": "Test message"}
         )
         
-        message = create_slack_message(session=db, slack_message_in=message_data)
+        message = create_slack_message(session=rollback_db, slack_message_in=message_data)
         
         assert message is not None
         assert message.slack_message_id == "1234567890.123456"
@@ -47,82 +79,51 @@ class TestSlackMessageCRUD:
         assert message.is_bot is False
         assert message.is_ai_response is False
 
-    def test_create_slack_message_with_bot(self, db: Session):
+    def test_create_slack_message_with_bot(self, rollback_db: Session):
         """Test crear mensaje de bot."""
-        message_data = SlackMessageCreate(
-            slack_message_id="1234567890.123456",
-            team_id="T1234567890",
-            channel_id="C1234567890",
-            user_id="U1234567890",
-            text="Bot message",
-            message_type="message",
-            timestamp="1234567890.123456",
+        message_data = _message_data(
+            "Bot message",
             is_bot=True,
             raw_event={"type": "message", "text": "Bot message", "bot_id": "B1234567890"}
         )
         
-        message = create_slack_message(session=db, slack_message_in=message_data)
+        message = create_slack_message(session=rollback_db, slack_message_in=message_data)
         
         assert message.is_bot is True
 
-    def test_create_slack_message_with_files(self, db: Session):
+    def test_create_slack_message_with_files(self, rollback_db: Session):
         """Test crear mensaje con archivos."""
-        message_data = SlackMessageCreate(
-            slack_message_id="1234567890.123456",
-            team_id="T1234567890",
-            channel_id="C1234567890",
-            user_id="U1234567890",
-            text="Message with files",
-            message_type="message",
-            timestamp="1234567890.123456",
-            files=[{"id": "F1234567890", "name": "test.txt"}],
-            raw_event={"type": "message", "text": "Message with files"}
+        message_data = _message_data(
+            "Message with files", files=[{"id": "F1234567890", "name": "test.txt"}]
         )
         
-        message = create_slack_message(session=db, slack_message_in=message_data)
+        message = create_slack_message(session=rollback_db, slack_message_in=message_data)
         
         assert len(message.files) == 1
         assert message.files[0]["id"] == "F1234567890"
         assert message.files[0]["name"] == "test.txt"
 
-    def test_create_slack_message_with_reactions(self, db: Session):
+    def test_create_slack_message_with_reactions(self, rollback_db: Session):
         """Test crear mensaje con reacciones."""
-        message_data = SlackMessageCreate(
-            slack_message_id="1234567890.123456",
-            team_id="T1234567890",
-            channel_id="C1234567890",
-            user_id="U1234567890",
-            text="Message with reactions",
-            message_type="message",
-            timestamp="1234567890.123456",
-            reactions=[{"name": "thumbsup", "count": 2}],
-            raw_event={"type": "message", "text": "Message with reactions"}
+        message_data = _message_data(
+            "Message with reactions", reactions=[{"name": "thumbsup", "count": 2}]
         )
         
-        message = create_slack_message(session=db, slack_message_in=message_data)
+        message = create_slack_message(session=rollback_db, slack_message_in=message_data)
         
         assert len(message.reactions) == 1
         assert message.reactions[0]["name"] == "thumbsup"
         assert message.reactions[0]["count"] == 2
 
-    def test_get_slack_message_by_id_success(self, db: Session):
+    def test_get_slack_message_by_id_success(self, rollback_db: Session):
         """Test obtener mensaje por ID exitosamente."""
         # Crear mensaje
-        message_data = SlackMessageCreate(
-            slack_message_id="1234567890.123456",
-            team_id="T1234567890",
-            channel_id="C1234567890",
-            user_id="U1234567890",
-            text="Test message",
-            message_type="message",
-            timestamp="1234567890.123456",
-            raw_event={"type": "message", "text": "Test message"}
-        )
-        created_message = create_slack_message(session=db, slack_message_in=message_data)
+        message_data = _message_data("Test message")
+        created_message = create_slack_message(session=rollback_db, slack_message_in=message_data)
         
         # Obtener mensaje
         retrieved_message = get_slack_message_by_id(
-            session=db, 
+            session=rollback_db, 
             slack_message_id="1234567890.123456"
         )
         
@@ -131,149 +132,152 @@ class TestSlackMessageCRUD:
         assert retrieved_message.text == "Test message"
         assert retrieved_message.slack_message_id == "1234567890.123456"
 
-    def test_get_slack_message_by_id_not_found(self, db: Session):
+    def test_get_slack_message_by_id_not_found(self, rollback_db: Session):
         """Test obtener mensaje por ID que no existe."""
         message = get_slack_message_by_id(
-            session=db, 
+            session=rollback_db, 
             slack_message_id="nonexistent.123456"
         )
         
         assert message is None
 
-    def test_get_slack_messages_empty(self, db: Session):
+    def test_get_slack_messages_empty(self, rollback_db: Session):
         """Test obtener mensajes cuando no hay ninguno."""
-        messages = get_slack_messages(session=db)
+        messages = get_slack_messages(session=rollback_db)
         
         assert len(messages) == 0
 
-    def test_get_slack_messages_with_data(self, db: Session):
+    def test_get_slack_messages_with_data(self, rollback_db: Session):
         """Test obtener mensajes con datos."""
         # Crear mensajes de prueba
+        messages_data = [_numbered_message(i) for i in range(1, 4)]
+        
+        create_slack_messages(session=rollback_db, slack_messages_in=messages_data)
+        
+        # Obtener mensajes
+        messages = get_slack_messages(session=rollback_db, skip=0, limit=10)
+        
+        assert len(messages) >= 3
+        assert all(msg.team_id == "T1234567890" for msg in messages)
+        assert all(msg.channel_id == "C1234567890" for msg in messages)
+
+    def test_create_slack_message_if_new(self, rollback_db: Session):
+        """Test insertar solo si el mensaje no existe (ON CONFLICT DO NOTHING)."""
+        message_data = SlackMessageCreate(
+            slack_message_id="if-new.1",
+            team_id="T1234567890",
+            channel_id="C1234567890",
+            user_id="U1234567890",
+            text="Mensaje nuevo",
+            message_type="message",
+            timestamp="1234567890.999999"
+        )
+        
+        first_id = create_slack_message_if_new(session=rollback_db, slack_message_in=message_data)
+        second_id = create_slack_message_if_new(session=rollback_db, slack_message_in=message_data)
+        
+        assert first_id is not None
+        assert second_id is None
+        assert get_slack_message_by_id(session=rollback_db, slack_message_id="if-new.1").id == first_id
+
+    def test_create_slack_messages_bulk(self, rollback_db: Session):
+        """Test insertar un lote de mensajes con un único commit."""
         messages_data = [
             SlackMessageCreate(
-                slack_message_id=f"1234567890.{i}",
+                slack_message_id=f"bulk.{i}",
                 team_id="T1234567890",
-                channel_id="C1234567890",
+                channel_id="C_BULK",
                 user_id="U1234567890",
-                text=f"Test message {i}",
+                text=f"Bulk message {i}",
                 message_type="message",
-                timestamp=f"1234567890.{i}",
-                raw_event={"type": "message", "text": f"Test message {i}"}
+                timestamp=f"1234567890.{i}"
             )
             for i in range(1, 4)
         ]
         
-        for message_data in messages_data:
-            create_slack_message(session=db, slack_message_in=message_data)
-        
-        # Obtener mensajes
-        messages = get_slack_messages(session=db, skip=0, limit=10)
+        count = create_slack_messages(session=rollback_db, slack_messages_in=messages_data)
         
-        assert len(messages) >= 3
-        assert all(msg.team_id == "T1234567890" for msg in messages)
-        assert all(msg.channel_id == "C1234567890" for msg in messages)
+        assert count == 3
+        assert count_slack_messages(session=rollback_db, channel_id="C_BULK") == 3
+        assert create_slack_messages(session=rollback_db, slack_messages_in=[]) == 0
 
-    def test_get_slack_messages_with_team_filter(self, db: Session):
+    def test_get_slack_messages_with_team_filter(self, rollback_db: Session):
         """Test obtener mensajes filtrados por equipo."""
         # Crear mensajes de diferentes equipos
         messages_data = [
-            SlackMessageCreate(
-                slack_message_id=f"1234567890.{i}",
-                team_id="T1234567890" if i % 2 == 0 else "T9876543210",
-                channel_id="C1234567890",
-                user_id="U1234567890",
-                text=f"Test message {i}",
-                message_type="message",
-                timestamp=f"1234567890.{i}",
-                raw_event={"type": "message", "text": f"Test message {i}"}
-            )
+            _numbered_message(i, team_id="T1234567890" if i % 2 == 0 else "T9876543210")
             for i in range(1, 6)
         ]
         
-        for message_data in messages_data:
-            create_slack_message(session=db, slack_message_in=message_data)
+        create_slack_messages(session=rollback_db, slack_messages_in=messages_data)
         
         # Obtener mensajes filtrados
-        messages = get_slack_messages(session=db, team_id="T1234567890")
+        messages = get_slack_messages(session=rollback_db, team_id="T1234567890")
         
         assert all(msg.team_id == "T1234567890" for msg in messages)
 
-    def test_get_slack_messages_with_channel_filter(self, db: Session):
+    def test_get_slack_messages_with_channel_filter(self, rollback_db: Session):
         """Test obtener mensajes filtrados por canal."""
         # Crear mensajes de diferentes canales
         messages_data = [
-            SlackMessageCreate(
-                slack_message_id=f"1234567890.{i}",
-                team_id="T1234567890",
-                channel_id="C1234567890" if i % 2 == 0 else "C9876543210",
-                user_id="U1234567890",
-                text=f"Test message {i}",
-                message_type="message",
-                timestamp=f"1234567890.{i}",
-                raw_event={"type": "message", "text": f"Test message {i}"}
-            )
+            _numbered_message(i, channel_id="C1234567890" if i % 2 == 0 else "C9876543210")
             for i in range(1, 6)
         ]
         
-        for message_data in messages_data:
-            create_slack_message(session=db, slack_message_in=message_data)
+        create_slack_messages(session=rollback_db, slack_messages_in=messages_data)
         
         # Obtener mensajes filtrados
-        messages = get_slack_messages(session=db, channel_id="C1234567890")
+        messages = get_slack_messages(session=rollback_db, channel_id="C1234567890")
         
         assert all(msg.channel_id == "C1234567890" for msg in messages)
 
-    def test_get_slack_messages_with_user_filter(self, db: Session):
-        """Test obtener mensajes filtrados por usuario."""
-        # Crear mensajes de diferentes usuarios
-        messages_data = [
-            SlackMessageCreate(
-                slack_message_id=f"1234567890.{i}",
+    def test_get_slack_messages_excluding_message(self, rollback_db: Session):
+        """Test excluir un mensaje en la consulta y aplicar el límite después."""
+        for i in range(1, 4):
+            create_slack_message(session=rollback_db, slack_message_in=SlackMessageCreate(
+                slack_message_id=f"exclude.{i}",
                 team_id="T1234567890",
-                channel_id="C1234567890",
-                user_id="U1234567890" if i % 2 == 0 else "U9876543210",
+                channel_id="C_EXCLUDE",
+                user_id="U1234567890",
                 text=f"Test message {i}",
                 message_type="message",
-                timestamp=f"1234567890.{i}",
-                raw_event={"type": "message", "text": f"Test message {i}"}
-            )
+                timestamp=f"1234567890.00{i}"
+            ))
+        
+        messages = get_slack_messages(
+            session=rollback_db, channel_id="C_EXCLUDE", limit=2, exclude_slack_message_id="exclude.3"
+        )
+        
+        assert [msg.slack_message_id for msg in messages] == ["exclude.2", "exclude.1"]
+
+    def test_get_slack_messages_with_user_filter(self, rollback_db: Session):
+        """Test obtener mensajes filtrados por usuario."""
+        # Crear mensajes de diferentes usuarios
+        messages_data = [
+            _numbered_message(i, user_id="U1234567890" if i % 2 == 0 else "U9876543210")
             for i in range(1, 6)
         ]
         
-        for message_data in messages_data:
-            create_slack_message(session=db, slack_message_in=message_data)
+        create_slack_messages(session=rollback_db, slack_messages_in=messages_data)
         
         # Obtener mensajes filtrados
-        messages = get_slack_messages(session=db, user_id="U1234567890")
+        messages = get_slack_messages(session=rollback_db, user_id="U1234567890")
         
         assert all(msg.user_id == "U1234567890" for msg in messages)
 
-    def test_get_slack_messages_pagination(self, db: Session):
+    def test_get_slack_messages_pagination(self, rollback_db: Session):
         """Test paginación de mensajes."""
         # Crear 10 mensajes
-        messages_data = [
-            SlackMessageCreate(
-                slack_message_id=f"1234567890.{i}",
-                team_id="T1234567890",
-                channel_id="C1234567890",
-                user_id="U1234567890",
-                text=f"Test message {i}",
-                message_type="message",
-                timestamp=f"1234567890.{i}",
-                raw_event={"type": "message", "text": f"Test message {i}"}
-            )
-            for i in range(1, 11)
-        ]
+        messages_data = [_numbered_message(i) for i in range(1, 11)]
         
-        for message_data in messages_data:
-            create_slack_message(session=db, slack_message_in=message_data)
+        create_slack_messages(session=rollback_db, slack_messages_in=messages_data)
         
         # Obtener primera página
-        messages_page1 = get_slack_messages(session=db, skip=0, limit=5)
+        messages_page1 = get_slack_messages(session=rollback_db, skip=0, limit=5)
         assert len(messages_page1) == 5
         
         # Obtener segunda página
-        messages_page2 = get_slack_messages(session=db, skip=5, limit=5)
+        messages_page2 = get_slack_messages(session=rollback_db, skip=5, limit=5)
         assert len(messages_page2) == 5
         
         # Verificar que son diferentes mensajes
@@ -281,35 +285,26 @@ class TestSlackMessageCRUD:
         page2_ids = {msg.slack_message_id for msg in messages_page2}
         assert page1_ids.isdisjoint(page2_ids)
 
-    def test_get_slack_messages_invalid_skip(self, db: Session):
+    def test_get_slack_messages_invalid_skip(self, rollback_db: Session):
         """Test obtener mensajes con skip inválido."""
         with pytest.raises(ValidationException, match="skip must be >= 0"):
-            get_slack_messages(session=db, skip=-1)
+            get_slack_messages(session=rollback_db, skip=-1)
 
-    def test_get_slack_messages_invalid_limit_zero(self, db: Session):
+    def test_get_slack_messages_invalid_limit_zero(self, rollback_db: Session):
         """Test obtener mensajes con limit inválido (cero)."""
         with pytest.raises(ValidationException, match="limit must be between 1 and 1000"):
-            get_slack_messages(session=db, limit=0)
+            get_slack_messages(session=rollback_db, limit=0)
 
-    def test_get_slack_messages_invalid_limit_too_high(self, db: Session):
+    def test_get_slack_messages_invalid_limit_too_high(self, rollback_db: Session):
         """Test obtener mensajes con limit inválido (muy alto)."""
         with pytest.raises(ValidationException, match="limit must be between 1 and 1000"):
-            get_slack_messages(session=db, limit=1001)
+            get_slack_messages(session=rollback_db, limit=1001)
 
-    def test_update_slack_message_success(self, db: Session):
+    def test_update_slack_message_success(self, rollback_db: Session):
         """Test actualizar mensaje exitosamente."""
         # Crear mensaje
-        message_data = SlackMessageCreate(
-            slack_message_id="1234567890.123456",
-            team_id="T1234567890",
-            channel_id="C1234567890",
-            user_id="U1234567890",
-            text="Original message",
-            message_type="message",
-            timestamp="1234567890.123456",
-            raw_event={"type": "message", "text": "Original message"}
-        )
-        created_message = create_slack_message(session=db, slack_message_in=message_data)
+        message_data = _message_data("Original message")
+        created_message = create_slack_message(session=rollback_db, slack_message_in=message_data)
         
         # Actualizar mensaje
         update_data = SlackMessageUpdate(
@@ -319,7 +314,7 @@ class TestSlackMessageCRUD:
         )
         
         updated_message = update_slack_message(
-            session=db, 
+            session=rollback_db, 
             db_message=created_message, 
             message_in=update_data
         )
@@ -329,26 +324,17 @@ class TestSlackMessageCRUD:
         assert updated_message.user_name == "updated_user"
         assert updated_message.team_id == "T1234567890"  # No debe cambiar
 
-    def test_update_slack_message_partial(self, db: Session):
+    def test_update_slack_message_partial(self, rollback_db: Session):
         """Test actualización parcial de mensaje."""
         # Crear mensaje
-        message_data = SlackMessageCreate(
-            slack_message_id="1234567890.123456",
-            team_id="T1234567890",
-            channel_id="C1234567890",
-            user_id="U1234567890",
-            text="Original message",
-            message_type="message",
-            timestamp="1234567890.123456",
-            raw_event={"type": "message", "text": "Original message"}
-        )
-        created_message = create_slack_message(session=db, slack_message_in=message_data)
+        message_data = _message_data("Original message")
+        created_message = create_slack_message(session=rollback_db, slack_message_in=message_data)
         
         # Actualizar solo el texto
         update_data = SlackMessageUpdate(text="Only text updated")
         
         updated_message = update_slack_message(
-            session=db, 
+            session=rollback_db, 
             db_message=created_message, 
             message_in=update_data
         )
@@ -357,117 +343,79 @@ class TestSlackMessageCRUD:
         assert updated_message.channel_name == "test-channel"  # No debe cambiar
         assert updated_message.user_name == "test_user"  # No debe cambiar
 
-    def test_delete_slack_message_success(self, db: Session):
+    def test_delete_slack_message_success(self, rollback_db: Session):
         """Test eliminar mensaje exitosamente."""
         # Crear mensaje
-        message_data = SlackMessageCreate(
-            slack_message_id="1234567890.123456",
-            team_id="T1234567890",
-            channel_id="C1234567890",
-            user_id="U1234567890",
-            text="Message to delete",
-            message_type="message",
-            timestamp="1234567890.123456",
-            raw_event={"type": "message", "text": "Message to delete"}
-        )
-        create_slack_message(session=db, slack_message_in=message_data)
+        message_data = _message_data("Message to delete")
+        create_slack_message(session=rollback_db, slack_message_in=message_data)
         
         # Eliminar mensaje
-        result = delete_slack_message(session=db, slack_message_id="1234567890.123456")
+        result = delete_slack_message(session=rollback_db, slack_message_id="1234567890.123456")
         
         assert result is True
         
         # Verificar que fue eliminado
-        deleted_message = get_slack_message_by_id(session=db, slack_message_id="1234567890.123456")
+        deleted_message = get_slack_message_by_id(session=rollback_db, slack_message_id="1234567890.123456")
         assert deleted_message is None
 
-    def test_delete_slack_message_not_found(self, db: Session):
+    def test_delete_slack_message_not_found(self, rollback_db: Session):
         """Test eliminar mensaje que no existe."""
-        result = delete_slack_message(session=db, slack_message_id="nonexistent.123456")
+        result = delete_slack_message(session=rollback_db, slack_message_id="nonexistent.123456")
         
         assert result is False
 
-    def test_count_slack_messages_empty(self, db: Session):
+    def test_count_slack_messages_empty(self, rollback_db: Session):
         """Test contar mensajes cuando no hay ninguno."""
-        count = count_slack_messages(session=db)
+        count = count_slack_messages(session=rollback_db)
         
         assert count == 0
 
-    def test_count_slack_messages_with_data(self, db: Session):
+    def test_count_slack_messages_with_data(self, rollback_db: Session):
         """Test contar mensajes con datos."""
         # Crear mensajes de prueba
-        messages_data = [
-            SlackMessageCreate(
-                slack_message_id=f"1234567890.{i}",
-                team_id="T1234567890",
-                channel_id="C1234567890",
-                user_id="U1234567890",
-                text=f"Test message {i}",
-                message_type="message",
-                timestamp=f"1234567890.{i}",
-                raw_event={"type": "message", "text": f"Test message {i}"}
-            )
-            for i in range(1, 6)
-        ]
+        messages_data = [_numbered_message(i) for i in range(1, 6)]
         
-        for message_data in messages_data:
-            create_slack_message(session=db, slack_message_in=message_data)
+        create_slack_messages(session=rollback_db, slack_messages_in=messages_data)
         
         # Contar mensajes
-        count = count_slack_messages(session=db)
+        count = count_slack_messages(session=rollback_db)
         
         assert count >= 5
 
-    def test_count_slack_messages_with_filters(self, db: Session):
+    def test_count_slack_messages_with_filters(self, rollback_db: Session):
         """Test contar mensajes con filtros."""
         # Crear mensajes de diferentes equipos
         messages_data = [
-            SlackMessageCreate(
-                slack_message_id=f"1234567890.{i}",
-                team_id="T1234567890" if i % 2 == 0 else "T9876543210",
-                channel_id="C1234567890",
-                user_id="U1234567890",
-                text=f"Test message {i}",
-                message_type="message",
-                timestamp=f"1234567890.{i}",
-                raw_event={"type": "message", "text": f"Test message {i}"}
-            )
+            _numbered_message(i, team_id="T1234567890" if i % 2 == 0 else "T9876543210")
             for i in range(1, 11)
         ]
         
-        for message_data in messages_data:
-            create_slack_message(session=db, slack_message_in=message_data)
+        create_slack_messages(session=rollback_db, slack_messages_in=messages_data)
         
         # Contar mensajes filtrados
-        count_team1 = count_slack_messages(session=db, team_id="T1234567890")
-        count_team2 = count_slack_messages(session=db, team_id="T9876543210")
+        count_team1 = count_slack_messages(session=rollback_db, team_id="T1234567890")
+        count_team2 = count_slack_messages(session=rollback_db, team_id="T9876543210")
         
         assert count_team1 == 5  # Mensajes con índice par
         assert count_team2 == 5  # Mensajes con índice impar
 
-    def test_count_slack_messages_multiple_filters(self, db: Session):
+    def test_count_slack_messages_multiple_filters(self, rollback_db: Session):
         """Test contar mensajes con múltiples filtros."""
         # Crear mensajes variados
         messages_data = [
-            SlackMessageCreate(
-                slack_message_id=f"1234567890.{i}",
-                team_id="T1234567890",
+            _numbered_message(
+                i,
                 channel_id="C1234567890" if i % 2 == 0 else "C9876543210",
-                user_id="U1234567890" if i % 3 == 0 else "U9876543210",
-                text=f"Test message {i}",
-                message_type="message",
-                timestamp=f"1234567890.{i}",
-                raw_event={"type": "message", "text": f"Test message {i}"}
+                user_id="U1234567890" if i % 3 == 0 else "U9876543210"
             )
             for i in range(1, 13)
         ]
         
-        for message_data in messages_data:
-            create_slack_message(session=db, slack_message_in=message_data)
+        create_slack_messages(session=rollback_db, slack_messages_in=messages_data)
         
         # Contar con múltiples filtros
         count = count_slack_messages(
-            session=db,
+            session=rollback_db,
             team_id="T1234567890",
             channel_id="C1234567890",
             user_id="U1234567890"
@@ -0,0 +1,31 @@
+from sqlmodel import Session
+
+from app.crud.slack_message_claim import (
+    claim_slack_message,
+    is_slack_message_claimed,
+    release_slack_message,
+)
+
+
+class TestSlackMessageClaimCRUD:
+    """Tests para las reservas de mensajes del bot del canal."""
+
+    def test_claim_slack_message_once(self, rollback_db: Session):
+        """Test que la segunda reserva vigente del mismo mensaje falla."""
+        first = claim_slack_message(session=rollback_db, channel_id="C_CRUD_CLAIM", message_id="m1", ttl_seconds=60)
+        second = claim_slack_message(session=rollback_db, channel_id="C_CRUD_CLAIM", message_id="m1", ttl_seconds=60)
+        
+        assert first is True
+        assert second is False
+        assert is_slack_message_claimed(session=rollback_db, channel_id="C_CRUD_CLAIM", message_id="m1", ttl_seconds=60)
+
+    def test_claim_slack_message_after_expiry_or_release(self, rollback_db: Session):
+        """Test que una reserva vencida o liberada se puede volver a tomar."""
+        claim_slack_message(session=rollback_db, channel_id="C_CRUD_CLAIM", message_id="m2", ttl_seconds=60)
+        
+        assert claim_slack_message(session=rollback_db, channel_id="C_CRUD_CLAIM", message_id="m2", ttl_seconds=-1)
+        
+        release_slack_message(session=rollback_db, channel_id="C_CRUD_CLAIM", message_id="m2")
+        
+        assert not is_slack_message_claimed(session=rollback_db, channel_id="C_CRUD_CLAIM", message_id="m2", ttl_seconds=60)
+        assert claim_slack_message(session=rollback_db, channel_id="C_CRUD_CLAIM", message_id="m2", ttl_seconds=60)
@@ -0,0 +1,27 @@
+from sqlmodel import Session
+
+from app.crud.slack_user import get_fresh_slack_users, upsert_slack_users
+
+
+class TestSlackUserCRUD:
+    """Tests para las operaciones CRUD del cache compartido de usuarios de Slack."""
+
+    def test_upsert_and_get_fresh_slack_users(self, rollback_db: Session):
+        """Test guardar, actualizar y leer usuarios vigentes."""
+        upsert_slack_users(session=rollback_db, users={"U_CRUD_1": {"name": "ana"}, "U_CRUD_2": {"name": "beto"}})
+        upsert_slack_users(session=rollback_db, users={"U_CRUD_1": {"name": "ana maria"}})
+        
+        users = get_fresh_slack_users(session=rollback_db, user_ids=["U_CRUD_1", "U_CRUD_2", "U_CRUD_3"], max_age_seconds=60)
+        
+        assert {user_id: info for user_id, (info, _) in users.items()} == {
+            "U_CRUD_1": {"name": "ana maria"},
+            "U_CRUD_2": {"name": "beto"},
+        }
+
+    def test_get_fresh_slack_users_skips_expired(self, rollback_db: Session):
+        """Test que los usuarios más viejos que max_age_seconds no se devuelven."""
+        upsert_slack_users(session=rollback_db, users={"U_CRUD_OLD": {"name": "viejo"}})
+        
+        users = get_fresh_slack_users(session=rollback_db, user_ids=["U_CRUD_OLD"], max_age_seconds=-1)
+        
+        assert users == {}
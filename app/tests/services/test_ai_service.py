@@ -6,10 +6,10 @@ Tests para el flujo de IA con LangGraph
 import asyncio
 import json
 import pytest
-from sqlmodel import Session, create_engine
-from app.core.config import settings
+from sqlmodel import Session
+from app.core.db import engine
 from app.services.ai_service import AIService
-from app.models.slack import SlackMessageCreate
+from app.models.slack import SlackMessage, SlackMessageCreate
 from app.crud.slack_message import create_slack_message
 
 
@@ -17,17 +17,9 @@ class TestAIService:
     """Tests para el servicio de IA."""
     
     @pytest.fixture
-    def session(self):
-        """Fixture para crear una sesión de base de datos."""
-        engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
-        session = Session(engine)
-        yield session
-        session.close()
-    
-    @pytest.fixture
-    def ai_service(self, session):
+    def ai_service(self, rollback_db):
         """Fixture para crear el servicio de IA."""
-        return AIService(session)
+        return AIService(rollback_db)
     
     def create_test_message(self, text: str, user_id: str = "U123456", channel_id: str = "C123456") -> dict:
         """Crea un mensaje de prueba"""
@@ -41,6 +33,41 @@ class TestAIService:
             "team": "T123456"
         }
     
+    def test_compact_context(self, ai_service):
+        """Prueba que el contexto descarta saludos y respeta el presupuesto de tokens"""
+        messages = [
+            SlackMessage(slack_message_id=f"m{i}", team_id="T123456", channel_id="C123456",
+                         user_id="U123456", text=text, timestamp=f"1234567890.00000{i}")
+            for i, text in enumerate([
+                "Hola equipo!",
+                "ok",
+                "el deploy de producción falló por el timeout de la base",
+                "x " * 4000,
+                "¿alguien revisó los logs del worker de pagos?",
+            ])
+        ]
+        
+        compacted = ai_service._compact_context(messages, budget_tokens=100)
+        
+        assert [msg.slack_message_id for msg in compacted] == ["m2", "m4"]
+        assert ai_service._compact_context([]) == []
+    
+    def test_dedupe_context_keeps_most_recent(self, ai_service):
+        """Prueba que los mensajes casi duplicados se colapsan en el más reciente"""
+        messages = [
+            SlackMessage(slack_message_id=f"m{i}", team_id="T123456", channel_id="C123456",
+                         user_id="U123456", text=text, timestamp=f"1234567890.00000{i}")
+            for i, text in enumerate([
+                "el deploy de producción falló por el timeout de la base",
+                "el deploy de producción falló por el timeout de la base!",
+                "¿alguien revisó los logs del worker de pagos?",
+            ])
+        ]
+        
+        deduped = ai_service._dedupe_context(messages)
+        
+        assert [msg.slack_message_id for msg in deduped] == ["m1", "m2"]
+    
     def test_ai_workflow(self, ai_service):
         """Prueba el flujo completo de IA"""
         
@@ -204,7 +231,6 @@ class TestAIService:
 # Función para ejecutar tests manualmente
 def run_manual_tests():
     """Ejecuta los tests manualmente para debugging."""
-    engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
     session = Session(engine)
     ai_service = AIService(session)
     
@@ -0,0 +1,145 @@
+"""
+Tests para el bot público del canal con especialistas.
+"""
+
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlmodel import Session, delete
+
+from app.core.db import engine
+from app.crud.slack_message import count_slack_messages
+from app.models import SlackMessage, SlackMessageClaim
+from app.services.channel_bot_service import ChannelBotService
+
+
+class TestChannelBotService:
+    """Tests para el servicio del bot del canal."""
+    
+    @pytest.fixture
+    def bot_service(self, db: Session):
+        """Fixture para crear el servicio con el LLM simulado."""
+        service = ChannelBotService(session=db)
+        service.ai_service = MagicMock()
+        return service
+    
+    @pytest.fixture
+    def claims_channel(self):
+        """Canal para las reservas de mensajes: se escriben con su propia sesión, se limpian al terminar."""
+        yield "C_CLAIMS"
+        with Session(engine) as session:
+            session.exec(delete(SlackMessageClaim).where(SlackMessageClaim.channel_id == "C_CLAIMS"))
+            session.commit()
+    
+    @pytest.fixture
+    def writer_channel(self):
+        """Canal para el escritor por lotes: escribe con su propia sesión, se limpia al terminar."""
+        yield "C_WRITER"
+        with Session(engine) as session:
+            session.exec(delete(SlackMessage).where(SlackMessage.channel_id == "C_WRITER"))
+            session.commit()
+    
+    @pytest.mark.asyncio
+    async def test_select_specialist_by_keywords(self, bot_service):
+        """El especialista se elige por keywords sin llamar al LLM."""
+        specialists = await bot_service.get_channel_specialists("C123456")
+        
+        selected = await bot_service.select_relevant_specialist(
+            "tengo un problema con async en nodejs y express", specialists
+        )
+        
+        assert selected.name == "Desarrollador Node.js"
+        bot_service.ai_service.generate_response.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_select_specialist_without_llm_router(self, bot_service):
+        """Sin coincidencias y sin router LLM no se elige especialista."""
+        specialists = await bot_service.get_channel_specialists("C123456")
+        
+        with patch("app.services.channel_bot_service.settings.USE_LLM_ROUTER", False):
+            selected = await bot_service.select_relevant_specialist("hola, ¿cómo va?", specialists)
+        
+        assert selected is None
+        bot_service.ai_service.generate_response.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_select_specialist_short_circuits_router(self, bot_service):
+        """Con un único especialista o uno nombrado en el texto no se consulta al LLM."""
+        specialists = await bot_service.get_channel_specialists("C123456")
+        
+        only = await bot_service.select_relevant_specialist("¿qué opinas?", specialists[:1])
+        named = await bot_service.select_relevant_specialist(
+            "Pregunta para el desarrollador node.js", specialists
+        )
+        
+        assert only is specialists[0]
+        assert named.name == "Desarrollador Node.js"
+        bot_service.ai_service.generate_response.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_channel_specialists_cached_until_configured(self, bot_service):
+        """Los especialistas se cachean por canal hasta reconfigurarlo."""
+        first = await bot_service.get_channel_specialists("C_CACHE")
+        second = await bot_service.get_channel_specialists("C_CACHE")
+        
+        await bot_service.configure_channel("C_CACHE", {})
+        third = await bot_service.get_channel_specialists("C_CACHE")
+        
+        assert first is second
+        assert third is not first
+    
+    @pytest.mark.asyncio
+    async def test_claim_is_exclusive_until_released(self, bot_service, claims_channel):
+        """Un mensaje se reserva una sola vez (también desde otra instancia) hasta liberarlo."""
+        other_service = ChannelBotService(session=bot_service.session)
+        
+        assert await bot_service._claim(claims_channel, "m1")
+        assert not await other_service._claim(claims_channel, "m1")
+        assert await other_service._has_already_responded(claims_channel, "m1")
+        
+        await bot_service._release(claims_channel, "m1")
+        
+        assert not await bot_service._has_already_responded(claims_channel, "m1")
+        assert await other_service._claim(claims_channel, "m1")
+    
+    @pytest.mark.asyncio
+    async def test_expired_claim_can_be_claimed_again(self, bot_service, claims_channel):
+        """Una reserva vencida se renueva en lugar de bloquear el mensaje para siempre."""
+        assert await bot_service._claim(claims_channel, "m2")
+        
+        with patch.object(ChannelBotService, "CLAIM_TTL_SECONDS", -1):
+            assert not await bot_service._has_already_responded(claims_channel, "m2")
+            assert await bot_service._claim(claims_channel, "m2")
+    
+    @pytest.mark.asyncio
+    async def test_channel_messages_written_in_batches(self, bot_service, writer_channel, db: Session, monkeypatch):
+        """Los mensajes del canal se encolan y se persisten por lotes."""
+        # El TestClient de la sesión mantiene el escritor de la app en su propio loop:
+        # el test usa uno propio y al terminar se restaura el de la app
+        monkeypatch.setattr(ChannelBotService, "_writer_task", None)
+        monkeypatch.setattr(ChannelBotService, "_write_queue", None)
+        # Registrar los lotes que persiste el escritor
+        batches = []
+        write_batch = ChannelBotService._write_batch
+        monkeypatch.setattr(ChannelBotService, "_write_batch",
+                            staticmethod(lambda batch: (batches.append(len(batch)), write_batch(batch))))
+        ChannelBotService.start_message_writer()
+        # ts únicos por corrida: un duplicado se descartaría sin fallar el test
+        run_ts = time.time_ns()
+        try:
+            for i in range(3):
+                await bot_service.handle_channel_message({
+                    "type": "message",
+                    "channel": writer_channel,
+                    "user": "U123456",
+                    "text": f"Mensaje {i}",
+                    "ts": f"{run_ts}.{i}",
+                    "team": "T123456"
+                })
+        finally:
+            await ChannelBotService.aclose()
+        
+        # Todos pasaron por la cola (ninguno se escribió directo) y quedaron en la base
+        assert sum(batches) == 3
+        assert count_slack_messages(session=db, channel_id=writer_channel) == 3
@@ -5,9 +5,11 @@ Tests para el sistema de respuestas programadas de Slack
 
 import asyncio
 import json
+from unittest.mock import AsyncMock
+
 import pytest
-from sqlmodel import Session, create_engine
-from app.core.config import settings
+from sqlmodel import Session
+from app.core.db import engine
 from app.services.slack_response_scheduler import SlackResponseScheduler
 
 
@@ -15,17 +17,9 @@ class TestSlackResponseScheduler:
     """Tests para el scheduler de respuestas de Slack."""
     
     @pytest.fixture
-    def session(self):
-        """Fixture para crear una sesión de base de datos."""
-        engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
-        session = Session(engine)
-        yield session
-        session.close()
-    
-    @pytest.fixture
-    def scheduler(self, session):
+    def scheduler(self, rollback_db):
         """Fixture para crear el scheduler."""
-        return SlackResponseScheduler(session)
+        return SlackResponseScheduler(rollback_db)
     
     def create_test_message(self, text: str, user_id: str = "U123456", channel_id: str = "C123456") -> dict:
         """Crea un mensaje de prueba"""
@@ -146,12 +140,66 @@ class TestSlackResponseScheduler:
         )
         
         print("✅ Respuesta de 'loco' programada correctamente")
+    
+    @pytest.mark.asyncio
+    async def test_scheduled_responses_sent_in_due_order(self, scheduler):
+        """Las respuestas programadas se envían por orden de vencimiento."""
+        scheduler._send_slack_response = AsyncMock(return_value=True)
+        
+        try:
+            scheduler.schedule_test_response(self.create_test_message("tarde"), "segunda", "T123456", delay_seconds=0.2)
+            scheduler.schedule_test_response(self.create_test_message("pronto"), "primera", "T123456", delay_seconds=0.1)
+            await asyncio.sleep(0.35)
+        finally:
+            await SlackResponseScheduler.aclose()
+        
+        sent = [call.args[1] for call in scheduler._send_slack_response.call_args_list]
+        assert sent == ["primera", "segunda"]
+    
+    @pytest.mark.asyncio
+    async def test_responses_to_same_thread_are_coalesced(self, scheduler):
+        """Las respuestas al mismo hilo dentro de la ventana salen en un solo mensaje, salvo las de alta urgencia."""
+        scheduler._send_slack_response = AsyncMock(return_value=True)
+        scheduler._delay_by_urgency = {"high": 0, "medium": 0, "low": 0}
+        scheduler._coalesce_window = 0.1
+        message = self.create_test_message("hilo")
+        
+        try:
+            scheduler.schedule_response(message, "medium", "uno", "T123456")
+            scheduler.schedule_response(message, "low", "dos", "T123456")
+            scheduler.schedule_response(message, "high", "urgente", "T123456")
+            await asyncio.sleep(0.25)
+        finally:
+            await SlackResponseScheduler.aclose()
+        
+        sent = [call.args[1] for call in scheduler._send_slack_response.call_args_list]
+        assert sent == ["urgente", "uno\ndos"]
+    
+    @pytest.mark.asyncio
+    async def test_aclose_waits_for_sends_in_flight(self, scheduler):
+        """Al cerrar se descartan los timers pendientes pero se esperan los envíos en curso."""
+        finished = []
+        
+        async def slow_send(channel_id, response, thread_ts, team_id):
+            await asyncio.sleep(0.1)
+            finished.append(response)
+            return True
+        
+        scheduler._send_slack_response = slow_send
+        scheduler.schedule_test_response(self.create_test_message("ya"), "en curso", "T123456", delay_seconds=0)
+        scheduler.schedule_test_response(self.create_test_message("luego"), "pendiente", "T123456", delay_seconds=10)
+        await asyncio.sleep(0.02)
+        
+        await SlackResponseScheduler.aclose()
+        
+        assert finished == ["en curso"]
+        assert not SlackResponseScheduler._pending
+        assert not SlackResponseScheduler._sending
 
 
 # Función para ejecutar tests manualmente
 async def run_manual_tests():
     """Ejecuta los tests manualmente para debugging."""
-    engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
     session = Session(engine)
     scheduler = SlackResponseScheduler(session)
     
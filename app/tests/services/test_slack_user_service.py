@@ -6,31 +6,52 @@ Tests para el procesamiento de menciones de usuario en Slack.
 import asyncio
 import sys
 import os
+import orjson
 import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
 
 # Agregar el directorio backend al path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'app'))
 
 from app.services.slack_user_service import SlackUserService
 from app.core.config import settings
-from sqlmodel import Session, create_engine
+from app.core.db import engine
+from app.models import SlackUser
+from sqlmodel import Session, delete
+
+
+def _users_info_response(payload: dict) -> MagicMock:
+    """Respuesta 200 de users.info con el payload dado."""
+    response = MagicMock(status_code=200)
+    response.content = orjson.dumps(payload)
+    return response
+
+
+def _patch_users_info(payload: dict = None, **mock_kwargs):
+    """Simula users.info en el cliente HTTP (con payload, todas las llamadas lo devuelven)."""
+    if payload is not None:
+        mock_kwargs["return_value"] = _users_info_response(payload)
+    return patch("httpx.AsyncClient.get", new=AsyncMock(**mock_kwargs))
 
 
 class TestSlackUserService:
     """Tests para el servicio de usuarios de Slack."""
     
     @pytest.fixture
-    def session(self):
-        """Fixture para crear una sesión de base de datos."""
-        engine = create_engine(settings.SQLALCHEMY_DATABASE_URI)
-        session = Session(engine)
-        yield session
-        session.close()
-    
-    @pytest.fixture
-    def user_service(self, session):
+    def user_service(self, rollback_db):
         """Fixture para crear el servicio de usuarios."""
-        return SlackUserService(session)
+        # El cache en memoria es de clase: cada test arranca y termina sin usuarios,
+        # aunque una aserción falle
+        service = SlackUserService(rollback_db)
+        service.clear_cache()
+        yield service
+        service.clear_cache()
+        SlackUserService._inflight.clear()
+        # El cache compartido (tabla slack_users) se escribe con su propia sesión,
+        # fuera del rollback: no dejar usuarios entre tests
+        with Session(engine) as session:
+            session.exec(delete(SlackUser))
+            session.commit()
     
     async def test_user_mentions_processing(self, user_service):
         """Prueba el procesamiento de menciones de usuario."""
@@ -108,12 +129,91 @@ class TestSlackUserService:
             print()
         
         print("✅ Pruebas de regex completadas!")
+    
+    @pytest.mark.asyncio
+    async def test_process_message_text_fetches_each_user_once(self, user_service):
+        """Las menciones repetidas se resuelven con una sola llamada y quedan en cache."""
+        
+        with _patch_users_info({"ok": True, "user": {"name": "juan", "profile": {"first_name": "Juan"}}}) as mock_get:
+            text = await user_service.process_message_text("<@U1> y <@U1> otra vez", "xoxp-test")
+            again = await user_service.process_message_text("Hola <@U1>", "xoxp-test")
+        
+        assert text == "@Juan y @Juan otra vez"
+        assert again == "Hola @Juan"
+        assert mock_get.await_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_user_not_found_is_cached(self, user_service):
+        """Un usuario inexistente queda en cache como no encontrado y no se vuelve a pedir."""
+        
+        with _patch_users_info({"ok": False, "error": "user_not_found"}) as mock_get:
+            assert await user_service.get_user_info("UGONE", "xoxp-test") is None
+            assert await user_service.get_user_info("UGONE", "xoxp-test") is None
+        
+        assert mock_get.await_count == 1
+        assert user_service.get_cache_stats() == {"cached_users": 0, "not_found_users": 1}
+        assert user_service.peek_user("UGONE") == (True, None)
+        assert user_service.peek_user("UNEW") == (False, None)
+    
+    @pytest.mark.asyncio
+    async def test_user_cache_evicts_least_recently_used(self, user_service, monkeypatch):
+        """El cache de usuarios está acotado y expulsa al usado menos recientemente."""
+        monkeypatch.setattr(SlackUserService, "USER_CACHE_MAX_SIZE", 2)
+        
+        with _patch_users_info({"ok": True, "user": {"name": "juan"}}):
+            await user_service.get_user_info("U1", "xoxp-test")
+            await user_service.get_user_info("U2", "xoxp-test")
+            await user_service.get_user_info("U1", "xoxp-test")  # U1 pasa a ser el más reciente
+            await user_service.get_user_info("U3", "xoxp-test")
+        
+        assert list(SlackUserService._user_cache) == ["U1", "U3"]
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_lookups_share_one_request(self, user_service):
+        """Las consultas concurrentes por el mismo usuario comparten una sola llamada a Slack."""
+        response = _users_info_response({"ok": True, "user": {"name": "juan"}})
+        
+        async def slow_get(*args, **kwargs):
+            await asyncio.sleep(0.05)
+            return response
+        
+        with _patch_users_info(side_effect=slow_get) as mock_get:
+            results = await asyncio.gather(
+                *(user_service.get_user_info("U9", "xoxp-test") for _ in range(5))
+            )
+        
+        assert [r["name"] for r in results] == ["juan"] * 5
+        assert mock_get.await_count == 1
+        assert "U9" not in SlackUserService._inflight
+    
+    @pytest.mark.asyncio
+    async def test_get_user_info_retries_after_rate_limit(self, user_service):
+        """Ante un 429 se espera Retry-After y se reintenta la consulta."""
+        rate_limited = MagicMock(status_code=429, headers={"Retry-After": "0"})
+        response = _users_info_response({"ok": True, "user": {"name": "juan"}})
+        
+        with _patch_users_info(side_effect=[rate_limited, response]) as mock_get:
+            user_info = await user_service.get_user_info("U7", "xoxp-test")
+        
+        assert user_info["name"] == "juan"
+        assert mock_get.await_count == 2
+    
+    @pytest.mark.asyncio
+    async def test_process_message_text_uses_shared_cache(self, user_service):
+        """Un usuario obtenido de Slack se guarda en la base y otro worker lo lee sin llamar a la API."""
+        
+        with _patch_users_info({"ok": True, "user": {"name": "juan", "profile": {"first_name": "Juan"}}}) as mock_get:
+            await user_service.process_message_text("Hola <@U2>", "xoxp-test")
+            user_service.clear_cache()  # Como si fuera otro worker, sin cache en memoria
+            text = await user_service.process_message_text("Chau <@U2>", "xoxp-test")
+        
+        assert text == "Chau @Juan"
+        assert mock_get.await_count == 1
 
 
 # Función para ejecutar tests manualmente
 async def run_manual_tests():
     """Ejecuta los tests manualmente para debugging."""
-    engine = create_engine(settings.SQLALCHEMY_DATABASE_URI)
     session = Session(engine)
     user_service = SlackUserService(session)
     
@@ -0,0 +1,38 @@
+import os
+
+from sqlalchemy import create_engine, make_url, text
+
+from app.core.config import settings
+
+
+def use_worker_database() -> None:
+    """
+    Con pytest-xdist, apunta la configuración a una base propia del worker
+    (<base>_gw0, <base>_gw1, ...) creada como copia de la base de tests ya migrada.
+    Debe llamarse antes de importar app.core.db, que crea el engine con esta URL.
+    """
+    worker = os.environ.get("PYTEST_XDIST_WORKER")
+    if not worker:
+        return
+
+    url = make_url(settings.SQLALCHEMY_DATABASE_URI)
+    worker_db = f"{url.database}_{worker}"
+
+    # CREATE DATABASE no puede ir dentro de una transacción; se conecta a la base
+    # de mantenimiento porque la plantilla no puede tener conexiones abiertas
+    # (client_encoding explícito: la base postgres suele crearse como SQL_ASCII)
+    admin = create_engine(
+        url.set(database="postgres"),
+        isolation_level="AUTOCOMMIT",
+        connect_args={"client_encoding": "utf8"},
+    )
+    with admin.connect() as connection:
+        connection.execute(text(f'DROP DATABASE IF EXISTS "{worker_db}"'))
+        connection.execute(
+            text(f'CREATE DATABASE "{worker_db}" TEMPLATE "{url.database}"')
+        )
+    admin.dispose()
+
+    settings.DATABASE_URL = url.set(database=worker_db).render_as_string(
+        hide_password=False
+    )
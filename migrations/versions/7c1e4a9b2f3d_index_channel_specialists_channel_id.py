@@ -0,0 +1,27 @@
+"""Index channel_specialists.channel_id
+
+Revision ID: 7c1e4a9b2f3d
+Revises: d26d6cd4ea67
+Create Date: 2026-10-15 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c1e4a9b2f3d'
+down_revision: Union[str, None] = 'd26d6cd4ea67'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_channel_specialists_channel_id'), 'channel_specialists', ['channel_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_channel_specialists_channel_id'), table_name='channel_specialists')
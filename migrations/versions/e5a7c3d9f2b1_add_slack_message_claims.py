@@ -0,0 +1,34 @@
+"""Add slack_message_claims table
+
+Revision ID: e5a7c3d9f2b1
+Revises: b4d2e8f1a6c9
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a7c3d9f2b1'
+down_revision: Union[str, None] = 'b4d2e8f1a6c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('slack_message_claims',
+    sa.Column('channel_id', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=False),
+    sa.Column('message_id', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=False),
+    sa.Column('claimed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('channel_id', 'message_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('slack_message_claims')